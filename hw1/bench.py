@@ -0,0 +1,116 @@
+import math
+import time
+import tempfile
+import argparse
+import cache
+import net
+import compound
+import query
+from replay import FIXTURE_DIR, RecordAdapter, ReplayAdapter
+
+DEFAULT_NAMES = ['H', 'C', 'O', 'Na', 'Fe', 'Cu', 'Ag', 'Au', 'Pb', 'U']
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[max(0, min(len(values) - 1, math.ceil(p / 100 * len(values)) - 1))]
+
+
+def reset():
+    # 冷启动: 清空内存和(临时目录里的)磁盘缓存
+    cache.clear(disk=True)
+    compound.use_compound_index(None)
+
+
+def measure(name):
+    # 用ele_query的progress回调打点, 相邻两个阶段之间的时间记到前一个阶段上
+    stamps = []
+    start = time.perf_counter()
+    query.ele_query(name, progress=lambda stage: stamps.append((stage, time.perf_counter())))
+    end = time.perf_counter()
+    stages = {}
+    for i, (stage, stamp) in enumerate(stamps):
+        stages[stage] = (stamps[i + 1][1] if i + 1 < len(stamps) else end) - stamp
+    return end - start, stages
+
+
+def run_single(names, repeat, warm):
+    totals = []
+    stages = {}
+    if warm:
+        reset()
+        for name in names:
+            query.ele_query(name)
+    for _ in range(repeat):
+        for name in names:
+            if not warm:
+                reset()
+            total, parts = measure(name)
+            totals.append(total)
+            for stage, seconds in parts.items():
+                stages.setdefault(stage, []).append(seconds)
+    return totals, stages
+
+
+def run_batch(names, repeat, warm):
+    totals = []
+    if warm:
+        reset()
+        query.ele_query_many(names)
+    for _ in range(repeat):
+        if not warm:
+            reset()
+        start = time.perf_counter()
+        query.ele_query_many(names)
+        totals.append(time.perf_counter() - start)
+    return totals
+
+
+def report(label, totals, stages=None):
+    print('{:<14} n={:<4} p50 {:8.2f} ms  p95 {:8.2f} ms  p99 {:8.2f} ms'.format(
+        label, len(totals), percentile(totals, 50) * 1000, percentile(totals, 95) * 1000,
+        percentile(totals, 99) * 1000))
+    for stage, values in (stages or {}).items():
+        print('    {:<12} p50 {:8.2f} ms  p95 {:8.2f} ms'.format(
+            stage, percentile(values, 50) * 1000, percentile(values, 95) * 1000))
+
+
+def record(names, fixture_dir):
+    # 访问ptable.com, 把页面, 性质json和化合物json保存为fixture
+    net.mount(RecordAdapter(fixture_dir))
+    for name in names:
+        query.ele_query(name)
+    print('recorded {} elements to {}'.format(len(names), fixture_dir))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='offline latency benchmark for ele_query')
+    parser.add_argument('names', nargs='*', default=DEFAULT_NAMES)
+    parser.add_argument('--record', action='store_true', help='query ptable.com and save fixtures')
+    parser.add_argument('--fixtures', default=FIXTURE_DIR)
+    parser.add_argument('--latency', type=float, default=0.0, help='injected latency per request, ms')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra uniform random latency, ms')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    query.use_snapshot(None)
+    # 测量时使用临时缓存目录, 不影响正常使用的缓存
+    cache.CACHE_DIR = tempfile.mkdtemp(prefix='ptable-bench-')
+    if args.record:
+        record(args.names, args.fixtures)
+        return
+    adapter = ReplayAdapter(args.fixtures, args.latency / 1000, args.jitter / 1000, seed=0)
+    net.mount(adapter)
+    print('replaying {} with {:.0f}±{:.0f} ms latency, {} names x {} repeats'.format(
+        args.fixtures, args.latency, args.jitter, len(args.names), args.repeat))
+    for warm in (False, True):
+        label = 'warm' if warm else 'cold'
+        totals, stages = run_single(args.names, args.repeat, warm)
+        report(label + ' single', totals, stages)
+        report(label + ' batch', run_batch(args.names, args.repeat, warm))
+    print('requests served: {}'.format(adapter.requests))
+    reset()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+import cache
+from ptable import PAGE_URL, extract_records
+
+DEFAULT_PAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ptable-page.html')
+
+
+def load_page(path=DEFAULT_PAGE):
+    # 第一次运行时保存一份页面, 之后的比较都基于同一份文件
+    if not os.path.exists(path):
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(cache.fetch(PAGE_URL))
+    with open(path, 'r', encoding='utf-8') as file:
+        return file.read()
+
+
+def bench(html, fast, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        records = extract_records(html, fast)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return records, times[len(times) // 2], times[0]
+
+
+def main():
+    # python bench_parse.py [page.html] [repeat]
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PAGE
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    html = load_page(path)
+    print('page: {} ({} KB)'.format(path, len(html) // 1024))
+    fast_records, fast_median, fast_best = bench(html, True, repeat)
+    bs4_records, bs4_median, bs4_best = bench(html, False, repeat)
+    if fast_records != bs4_records:
+        raise SystemExit('records differ between the fast path and bs4')
+    print('{} records, identical on both paths'.format(len(fast_records)))
+    print('bs4     median {:8.2f} ms  best {:8.2f} ms'.format(bs4_median * 1000, bs4_best * 1000))
+    print('fast    median {:8.2f} ms  best {:8.2f} ms'.format(fast_median * 1000, fast_best * 1000))
+    print('speedup {:.1f}x'.format(bs4_median / fast_median))
+
+
+if __name__ == '__main__':
+    main()
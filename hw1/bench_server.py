@@ -0,0 +1,87 @@
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+import cache
+import net
+import query
+import server
+from bench import percentile
+from replay import FIXTURE_DIR, ReplayAdapter
+
+# 服务吞吐量测试: 上游是replay回放的fixture, 服务和客户端在同一进程的不同线程里
+
+
+def start_server(service):
+    # 在后台线程的事件循环里运行服务, 返回端口
+    ready = threading.Event()
+    holder = {}
+
+    def run():
+        loop = asyncio.new_event_loop()
+        holder['server'] = loop.run_until_complete(server.start(service, port=0))
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return holder['server'].sockets[0].getsockname()[1]
+
+
+async def client(port, paths, latencies):
+    reader, writer = await asyncio.open_connection(server.HOST, port)
+    for path in paths:
+        start = time.perf_counter()
+        writer.write('GET {} HTTP/1.1\r\nHost: localhost\r\n\r\n'.format(path).encode('latin-1'))
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            if line.lower().startswith(b'content-length:'):
+                length = int(line.split(b':')[1])
+        await reader.readexactly(length)
+        latencies.append(time.perf_counter() - start)
+    writer.close()
+
+
+async def load(port, paths, connections):
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(port, paths[i::connections], latencies) for i in range(connections)))
+    return time.perf_counter() - start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description='throughput benchmark for server.py')
+    parser.add_argument('names', nargs='*', default=['H', 'C', 'O'])
+    parser.add_argument('--fixtures', default=FIXTURE_DIR)
+    parser.add_argument('--latency', type=float, default=50.0, help='injected upstream latency, ms')
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--connections', type=int, default=32)
+    args = parser.parse_args()
+
+    query.use_snapshot(None)
+    cache.CACHE_DIR = tempfile.mkdtemp(prefix='ptable-bench-')
+    adapter = ReplayAdapter(args.fixtures, args.latency / 1000)
+    net.mount(adapter)
+    service = server.Service()
+    port = start_server(service)
+
+    # 冷缓存时同时发出的相同请求只应该触发一次上游查询
+    paths = ['/element?name=' + args.names[0]] * args.connections
+    elapsed, _ = asyncio.run(load(port, paths, args.connections))
+    print('coalescing: {} concurrent identical queries -> {} query, {} upstream HTTP requests, {:.1f} ms'.format(
+        len(paths), service.upstream, adapter.requests, elapsed * 1000))
+
+    paths = ['/element?name=' + args.names[i % len(args.names)] for i in range(args.requests)]
+    elapsed, latencies = asyncio.run(load(port, paths, args.connections))
+    print('warm /element: {} requests over {} connections in {:.2f} s -> {:.0f} req/s, p50 {:.2f} ms, p99 {:.2f} ms'.format(
+        len(paths), args.connections, elapsed, len(paths) / elapsed,
+        percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000))
+    print('upstream HTTP requests in total: {}'.format(adapter.requests))
+
+
+if __name__ == '__main__':
+    main()
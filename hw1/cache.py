@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import net
+import timing
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+DEFAULT_TTL = 24 * 60 * 60
+# 过期不超过这么久的缓存先直接返回, 同时在后台更新
+STALE_WHILE_REVALIDATE = 24 * 60 * 60
+
+# hit: 内存或磁盘中的缓存仍然有效; miss: 需要访问网络; revalidated: 服务器返回304
+# stale: 返回了过期的缓存(后台更新中, 或者网络出错)
+stats = {'hit': 0, 'miss': 0, 'revalidated': 0, 'stale': 0}
+_entries = {}
+_parsed = {}
+_lock = threading.Lock()
+_url_locks = {}
+_refreshing = set()
+
+
+def _path(url):
+    return os.path.join(CACHE_DIR, hashlib.sha1(url.encode('utf-8')).hexdigest())
+
+
+def _load(url):
+    path = _path(url)
+    try:
+        with open(path + '.meta', 'r', encoding='utf-8') as file:
+            entry = json.load(file)
+        with open(path + '.body', 'r', encoding='utf-8') as file:
+            entry['text'] = file.read()
+    except (OSError, ValueError):
+        return None
+    # 内容和摘要对不上(写到一半或者body和meta不是同一次写入的)时当作没有缓存
+    if entry.get('digest') != hashlib.sha1(entry['text'].encode('utf-8')).hexdigest():
+        return None
+    return entry
+
+
+def _write(path, write):
+    # 先写临时文件再替换; 界面, 命令行和服务可能同时写同一个缓存目录
+    tmp_path = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            write(file)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _save(url, entry, body=True):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _path(url)
+    if body:
+        _write(path + '.body', lambda file: file.write(entry['text']))
+    meta = {k: v for k, v in entry.items() if k != 'text'}
+    _write(path + '.meta', lambda file: json.dump(meta, file))
+
+
+def _url_lock(url):
+    with _lock:
+        return _url_locks.setdefault(url, threading.Lock())
+
+
+def _count(key):
+    with _lock:
+        stats[key] += 1
+
+
+def _download(url, entry):
+    req_headers = {}
+    if entry is not None:
+        # 带上校验信息, 内容没变时服务器只返回304
+        if entry.get('etag'):
+            req_headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            req_headers['If-Modified-Since'] = entry['last_modified']
+    r = net.get(url, headers=req_headers)
+    if r.status_code == 304 and entry is not None:
+        _count('revalidated')
+        timing.note('revalidated', len(r.content))
+        entry['time'] = time.time()
+        _save(url, entry, body=False)
+        return entry
+    r.raise_for_status()
+    r.encoding = r.encoding or 'utf-8'
+    text = r.text
+    timing.note('miss', len(r.content))
+    entry = {'url': url,
+             'time': time.time(),
+             'etag': r.headers.get('ETag'),
+             'last_modified': r.headers.get('Last-Modified'),
+             'digest': hashlib.sha1(text.encode('utf-8')).hexdigest(),
+             'text': text}
+    _save(url, entry)
+    return entry
+
+
+def _revalidate(url):
+    try:
+        with _url_lock(url):
+            _entries[url] = _download(url, _entries.get(url))
+    except Exception:
+        pass
+    finally:
+        with _lock:
+            _refreshing.discard(url)
+
+
+def _serve_stale(url, entry):
+    _count('stale')
+    timing.note('stale')
+    return entry
+
+
+def _acquire(url):
+    # 等锁的时间也算在net.deadline里; 超时返回None
+    lock = _url_lock(url)
+    timeout = net.remaining()
+    if not lock.acquire(timeout=-1 if timeout is None else timeout):
+        return None
+    return lock
+
+
+def fetch_entry(url, ttl=DEFAULT_TTL, refresh=False, stale=STALE_WHILE_REVALIDATE):
+    # 后台更新期间不等锁, 直接返回旧内容
+    if not refresh and url in _refreshing and url in _entries:
+        return _serve_stale(url, _entries[url])
+    # 每个url一把锁, 不同url可以同时下载, 同一url只下载一次
+    lock = _acquire(url)
+    if lock is None:
+        # 别的线程还在下载, 截止时间前等不到时退回到任意旧的缓存
+        entry = _entries.get(url) or _load(url)
+        if entry is None:
+            raise net.NetworkError(url, 'deadline exceeded waiting for another download')
+        return _serve_stale(url, entry)
+    try:
+        return _fetch_locked(url, ttl, refresh, stale)
+    finally:
+        lock.release()
+
+
+def _fetch_locked(url, ttl, refresh, stale):
+    entry = _entries.get(url)
+    if entry is None:
+        entry = _load(url)
+    if entry is not None and not refresh:
+        _entries[url] = entry
+        age = time.time() - entry['time']
+        if age < ttl:
+            _count('hit')
+            timing.note('hit')
+            return entry
+        if age < ttl + stale:
+            with _lock:
+                start = url not in _refreshing
+                _refreshing.add(url)
+            if start:
+                threading.Thread(target=_revalidate, args=(url,), daemon=True).start()
+            return _serve_stale(url, entry)
+    _count('miss')
+    try:
+        entry = _download(url, None if refresh else entry)
+    except net.NetworkError:
+        # 源站不可用时退回到任意旧的缓存
+        if entry is None:
+            raise
+        return _serve_stale(url, entry)
+    _entries[url] = entry
+    return entry
+
+
+def fetch(url, ttl=DEFAULT_TTL, refresh=False):
+    return fetch_entry(url, ttl, refresh)['text']
+
+
+def fetch_parsed(url, parse, ttl=DEFAULT_TTL, refresh=False, stage='fetch'):
+    # 解析结果按内容摘要缓存, 页面没有变化时不会重复解析
+    # stage是计时记录里的阶段名前缀, 分别记录下载和解析两步
+    with timing.stage(stage + '.fetch'):
+        entry = fetch_entry(url, ttl, refresh)
+    key = (url, parse)
+    cached = _parsed.get(key)
+    if cached is not None and cached[0] == entry['digest']:
+        return cached[1]
+    with timing.stage(stage + '.parse'):
+        result = parse(entry['text'])
+    _parsed[key] = (entry['digest'], result)
+    return result
+
+
+def fetch_json(url, ttl=DEFAULT_TTL, refresh=False, stage='fetch'):
+    return fetch_parsed(url, json.loads, ttl, refresh, stage)
+
+
+def clear(disk=False):
+    with _lock:
+        _entries.clear()
+        _parsed.clear()
+        for key in stats:
+            stats[key] = 0
+        if disk and os.path.isdir(CACHE_DIR):
+            # 只删除下载的缓存; 同一目录下的化合物索引和查询次数统计不是缓存, 要保留
+            for file_name in os.listdir(CACHE_DIR):
+                if file_name.endswith(('.body', '.meta')):
+                    os.remove(os.path.join(CACHE_DIR, file_name))
@@ -0,0 +1,97 @@
+import sys
+import json
+import argparse
+
+# 命令行查询, 不导入PyQt6; 缓存有效时也不会导入requests
+# python -m cli Pb 铁 26
+# python -m cli --json --fields name,weight - < names.txt
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m cli', description='query elements from the command line')
+    parser.add_argument('names', nargs='+', help="symbol, Chinese name, English name or atomic number; '-' reads names from stdin")
+    parser.add_argument('--fields', help='comma separated fields to print, default: all')
+    parser.add_argument('--json', action='store_true', help='print one JSON object per line')
+    parser.add_argument('--snapshot', action='store_true', help='answer from the offline snapshot')
+    parser.add_argument('--snapshot-path', metavar='PATH', help='snapshot file to use, implies --snapshot')
+    parser.add_argument('--timings', metavar='FILE', help="append per-query timing records as JSON lines, '-' for stderr")
+    return parser.parse_args(argv)
+
+
+def read_names(names):
+    result = []
+    for name in names:
+        if name == '-':
+            result.extend(line.strip() for line in sys.stdin if line.strip())
+        else:
+            result.append(name)
+    return result
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    from element import FIELDS
+    import query
+    import timing
+    from ptable import ElementNotFound
+    fields = args.fields.split(',') if args.fields else list(FIELDS)
+    unknown = [f for f in fields if f not in FIELDS]
+    if unknown:
+        sys.exit('unknown fields: ' + ', '.join(unknown))
+    if args.snapshot or args.snapshot_path:
+        query.use_snapshot(args.snapshot_path or query.snapshot.DEFAULT_PATH)
+    out = None
+    if args.timings:
+        out = sys.stderr if args.timings == '-' else open(args.timings, 'a', encoding='utf-8')
+
+    def dump(record):
+        out.write(json.dumps(record.to_dict(), ensure_ascii=False) + '\n')
+
+    # 先查到所有元素并在后台开始加载, 再按输入顺序等待和输出
+    names = read_names(args.names)
+    elements = []
+    records = []
+    for name in names:
+        collected = []
+        try:
+            with timing.collect(name, collected.append if out is not None else None):
+                element = query.ele_query(name, lazy=True)
+                query.prefetch(element, *fields)
+        except Exception as e:
+            element = e
+        elements.append(element)
+        records.append(collected[0] if collected else None)
+    failed = 0
+    for name, element, record in zip(names, elements, records):
+        try:
+            if isinstance(element, Exception):
+                raise element
+            element.resolve(*fields)
+        except ElementNotFound:
+            print('{}: no such element'.format(name), file=sys.stderr)
+            failed += 1
+            continue
+        except Exception as e:
+            print('{}: {}'.format(name, e), file=sys.stderr)
+            failed += 1
+            continue
+        finally:
+            # 字段在后台加载, collect结束时记录还不完整, 等resolve之后再写出; 总时间算到字段加载完为止
+            if record is not None:
+                if not isinstance(element, Exception):
+                    record.finish()
+                dump(record)
+        row = {field: getattr(element, field) for field in fields}
+        if args.json:
+            print(json.dumps(row, ensure_ascii=False))
+        else:
+            for field, value in row.items():
+                print('{} = {}'.format(field, ','.join(value) if isinstance(value, list) else value))
+            print()
+    if out is not None and out is not sys.stderr:
+        out.close()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,33 +1,181 @@
 from utils import *
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cache
+import formula
+import timing
 
+COMPOUNDS_URL = "https://ptable.com/JSON/compounds/formula="
+INDEX_VERSION = 2
+INDEX_NAME = 'compound-index.json'
 
-def find_compound(name):
-    url = "https://ptable.com/JSON/compounds/formula=" + name
-    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 (KHTML, like Gecko)\
-        Chrome/55.0.2883.87 Safari/537.36'}
-    r = requests.get(url, headers=headers)
-    hjson = json.loads(r.text)
-    result = []
-    count = 0
-    for com_dic in hjson['matches']:
-        com_name = com_dic['molecularformula']
-        if name in com_name and len(com_name) != len(name):
-            if len(name) == 2:
-                result.append(com_name)
-                count = count + 1
-            else:
-                pos = com_name.find(name)
-                if pos == len(name) + 1 and pos != 1 and '^' not in com_name:
-                    result.append(com_name)
-                    count = count + 1
-        if count >= 3:
-            break
-    return result
+_index = None
+_index_lock = threading.Lock()
 
 
+class CompoundIndex:
+    # 倒排索引: 元素符号 -> 含有该元素的化合物编号(升序), 用于求交集
+    # ranked: 元素符号 -> 该元素自己的化合物页面中的化合物编号, 保持页面顺序, 用于取前k个
+    def __init__(self):
+        self.formulas = []
+        self.ids = {}
+        self.postings = {}
+        self.ranked = {}
+        self._sets = {}
+
+    def add(self, com_name):
+        # 离子(带'^')和单质不算化合物, 解析不了的式子也跳过; 已经收录的返回原来的编号
+        if com_name in self.ids:
+            return self.ids[com_name]
+        if '^' in com_name:
+            return None
+        try:
+            symbols = formula.elements(com_name)
+        except ValueError:
+            return None
+        if len(symbols) < 2:
+            return None
+        com_id = len(self.formulas)
+        self.formulas.append(com_name)
+        self.ids[com_name] = com_id
+        for symbol in symbols:
+            self.postings.setdefault(symbol, []).append(com_id)
+            self._sets.pop(symbol, None)
+        return com_id
+
+    def add_page(self, symbol, com_names):
+        # 一个元素的化合物页面: 编号是全局的, 排名按这一页自己的顺序
+        ranked = self.ranked.setdefault(symbol, [])
+        seen = set(ranked)
+        for com_name in com_names:
+            com_id = self.add(com_name)
+            if com_id is None or com_id in seen or symbol not in formula.elements(com_name):
+                continue
+            seen.add(com_id)
+            ranked.append(com_id)
+
+    def _set(self, symbol):
+        result = self._sets.get(symbol)
+        if result is None:
+            result = self._sets[symbol] = set(self.postings.get(symbol, ()))
+        return result
+
+    def top(self, symbol, k=3):
+        # 没有下载过该元素的页面时退回到倒排表的顺序
+        ids = self.ranked[symbol] if symbol in self.ranked else self.postings.get(symbol, [])
+        return [self.formulas[i] for i in ids[:k]]
+
+    def containing(self, symbols, k=None):
+        # 从最短的倒排表开始, 其余的用集合判断; 凑够k个就停止
+        symbols = sorted(set(symbols), key=lambda s: len(self.postings.get(s, ())))
+        if not symbols:
+            return []
+        others = [self._set(s) for s in symbols[1:]]
+        result = []
+        for com_id in self.postings.get(symbols[0], []):
+            if all(com_id in other for other in others):
+                result.append(self.formulas[com_id])
+                if k is not None and len(result) >= k:
+                    break
+        return result
+
+    def to_dict(self):
+        return {'version': INDEX_VERSION, 'formulas': self.formulas, 'postings': self.postings,
+                'ranked': self.ranked}
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != INDEX_VERSION:
+            raise ValueError('unsupported compound index version: {}'.format(data.get('version')))
+        # 倒排表随索引一起保存, 读取时不需要重新解析化学式
+        index = cls()
+        index.formulas = data['formulas']
+        index.ids = {com_name: com_id for com_id, com_name in enumerate(index.formulas)}
+        index.postings = data['postings']
+        index.ranked = data['ranked']
+        return index
+
+
+def _matches(name, refresh=False):
+    return cache.fetch_json(COMPOUNDS_URL + name, refresh=refresh, stage='compounds')['matches']
+
+
+def build_compound_index(symbols, workers=8, refresh=False):
+    # 每个元素的化合物列表只下载一次(经过cache), 按元素顺序合并去重
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pages = list(pool.map(lambda s: _matches(s, refresh), symbols))
+    index = CompoundIndex()
+    for symbol, matches in zip(symbols, pages):
+        index.add_page(symbol, [com_dic['molecularformula'] for com_dic in matches])
+    return index
+
+
+def _index_path():
+    # 跟随cache.CACHE_DIR, 换缓存目录时索引也一起换
+    return os.path.join(cache.CACHE_DIR, INDEX_NAME)
+
+
+def save_compound_index(index, path=None):
+    path = path or _index_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    cache._write(path, lambda file: json.dump(index.to_dict(), file, separators=(',', ':')))
+
+
+def load_compound_index(path=None):
+    path = path or _index_path()
+    with open(path, 'r', encoding='utf-8') as file:
+        return CompoundIndex.from_dict(json.load(file))
+
+
+def get_compound_index():
+    # 磁盘上有索引时只读一次, 之后的查询都在内存中完成; 没有时返回None
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                try:
+                    _index = load_compound_index()
+                except (OSError, ValueError):
+                    return None
+    return _index
+
+
+def use_compound_index(index):
+    global _index
+    _index = index
+
+
+def find_compound(name, k=3):
+    index = get_compound_index()
+    if index is not None:
+        with timing.stage('compounds.index'):
+            return index.top(name, k)
+    # 还没有建索引时, 只为这一个元素建一个临时索引
+    matches = _matches(name)
+    with timing.stage('compounds.scan'):
+        partial = CompoundIndex()
+        partial.add_page(name, [com_dic['molecularformula'] for com_dic in matches])
+        return partial.top(name, k)
+
+
+def find_compounds_with(symbols, k=None):
+    index = get_compound_index()
+    if index is None:
+        raise LookupError('compound index not built; run `python compound.py build`')
+    return index.containing(symbols, k)
 
 
 def main():
+    # python compound.py build  建立全部元素的化合物索引
+    if len(sys.argv) > 1 and sys.argv[1] == 'build':
+        from ptable import get_index as get_element_index
+        symbols = list(dict.fromkeys(r['symbol'] for r in get_element_index()['records']))
+        index = build_compound_index(symbols)
+        save_compound_index(index)
+        use_compound_index(index)
+        print('indexed {} compounds for {} elements'.format(len(index.formulas), len(index.postings)))
+        return
     name = 'H'
     temp = find_compound(name)
     print(temp)
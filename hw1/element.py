@@ -1,4 +1,43 @@
+import threading
+import contextvars
+from concurrent.futures import Future
+
+FIELDS = ('name', 'number', 'weight', 'melting_point', 'boiling_point', 'crust', 'meteor',
+          'ocean', 'solar', 'universe', 'discover', 'compound')
+# 来自性质json的一组字段, 一次加载
+PROPERTY_FIELDS = ('melting_point', 'boiling_point', 'crust', 'meteor', 'ocean', 'solar', 'universe', 'discover')
+
+
+class Deferred:
+    # 延迟加载的一组字段: 第一次访问时在当前线程加载, 也可以先用start放到线程池里
+    # load在创建时的上下文中运行, 计时记录等上下文变量可以带过去
+    def __init__(self, load):
+        self.load = load
+        self.context = contextvars.copy_context()
+        self.future = None
+        self.lock = threading.Lock()
+
+    def start(self, pool):
+        with self.lock:
+            if self.future is None:
+                self.future = pool.submit(self.context.run, self.load)
+
+    def wait(self):
+        with self.lock:
+            run = self.future is None
+            if run:
+                self.future = Future()
+        if run:
+            try:
+                self.future.set_result(self.context.run(self.load))
+            except BaseException as e:
+                self.future.set_exception(e)
+        return self.future.result()
+
+
 class Element:
+    __slots__ = FIELDS + ('_deferred',)
+
     def __init__(self, name, number, weight):
         self.name = name
         self.number = number
@@ -12,6 +51,50 @@ class Element:
         self.universe = None
         self.discover = None
         self.compound = []
+        self._deferred = {}
+
+    def __getattr__(self, name):
+        # 只有还没有赋值的字段会走到这里
+        if name == '_deferred':
+            raise AttributeError(name)
+        deferred = self._deferred.get(name)
+        if deferred is None:
+            raise AttributeError(name)
+        deferred.wait()
+        for key in [k for k, v in self._deferred.items() if v is deferred]:
+            self._deferred.pop(key, None)
+        return object.__getattribute__(self, name)
+
+    def defer(self, fields, load):
+        # load负责给fields中的字段赋值
+        deferred = Deferred(load)
+        for field in fields:
+            delattr(self, field)
+            self._deferred[field] = deferred
+        return deferred
+
+    def start(self, pool, *fields):
+        # 在线程池中开始加载指定字段(默认全部)所在的组
+        deferred = dict(self._deferred)
+        for item in {deferred[field] for field in fields or deferred if field in deferred}:
+            item.start(pool)
+
+    def resolve(self, *fields):
+        # 等待指定字段(默认全部)加载完成
+        for field in fields or FIELDS:
+            getattr(self, field)
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in FIELDS}
+
+    @classmethod
+    def from_dict(cls, data):
+        element = cls(data['name'], data['number'], data['weight'])
+        for key, value in data.items():
+            if key in FIELDS:
+                setattr(element, key, value)
+        element.compound = list(element.compound)
+        return element
 
     def print(self):
         print("name = " + self.name)
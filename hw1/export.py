@@ -0,0 +1,170 @@
+import os
+import csv
+import sys
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from element import FIELDS
+from query import ele_query, ele_numbers
+
+FORMATS = ('csv', 'jsonl', 'parquet')
+CHUNK = 16
+
+
+class _Progress:
+    # 旁边的.progress文件: 第一行 {"format": 格式, "columns": [...]},
+    # 之后每写完一批追加一行 {"offset": 输出文件长度, "numbers": [...]}
+    # 中断后从最后一行的offset截断输出文件, 跳过已经写好的元素; 格式或列不同时从头开始
+    def __init__(self, path):
+        self.path = path + '.progress'
+
+    def load(self, fmt, columns):
+        offset, done = 0, set()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                try:
+                    header = json.loads(file.readline())
+                except ValueError:
+                    return None
+                if not isinstance(header, dict) or header.get('format') != fmt or header.get('columns') != columns:
+                    return None
+                for line in file:
+                    try:
+                        item = json.loads(line)
+                    except ValueError:
+                        break
+                    offset = item['offset']
+                    done.update(item['numbers'])
+        except OSError:
+            return None
+        return offset, done
+
+    def start(self, fmt, columns):
+        with open(self.path, 'w', encoding='utf-8') as file:
+            file.write(json.dumps({'format': fmt, 'columns': columns}) + '\n')
+
+    def add(self, offset, numbers):
+        with open(self.path, 'a', encoding='utf-8') as file:
+            file.write(json.dumps({'offset': offset, 'numbers': numbers}) + '\n')
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _row(element, columns):
+    element.resolve(*columns)
+    return {column: getattr(element, column) for column in columns}
+
+
+def _csv_value(value):
+    return ';'.join(value) if isinstance(value, list) else value
+
+
+def _rows(numbers, columns, workers):
+    # 每次只查询一批, 内存占用与元素总数无关; 只加载选中的列需要的数据
+    def query(number):
+        try:
+            return number, _row(ele_query(number, lazy=True), columns)
+        except Exception as e:
+            return number, e
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(numbers), CHUNK):
+            yield list(pool.map(query, numbers[start:start + CHUNK]))
+
+
+def _write_text(path, fmt, numbers, columns, workers, resume):
+    progress = _Progress(path)
+    state = progress.load(fmt, columns) if resume and os.path.exists(path) else None
+    if state is None:
+        offset, done = 0, set()
+        progress.start(fmt, columns)
+    else:
+        offset, done = state
+    failed = []
+    with open(path, 'a+', encoding='utf-8', newline='') as file:
+        file.seek(offset)
+        file.truncate()
+        writer = csv.DictWriter(file, columns) if fmt == 'csv' else None
+        if writer is not None and offset == 0:
+            writer.writeheader()
+        for chunk in _rows([n for n in numbers if n not in done], columns, workers):
+            written = []
+            for number, row in chunk:
+                if isinstance(row, Exception):
+                    failed.append((number, row))
+                    continue
+                if writer is not None:
+                    writer.writerow({k: _csv_value(v) for k, v in row.items()})
+                else:
+                    file.write(json.dumps(row, ensure_ascii=False) + '\n')
+                written.append(number)
+            file.flush()
+            progress.add(file.tell(), written)
+    return failed
+
+
+def _write_parquet(path, numbers, columns, workers, resume):
+    # parquet文件写完后不能追加, 先流式写入可续传的jsonl, 最后按批转换
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError('pyarrow is required for parquet export')
+    staging = path + '.jsonl'
+    failed = _write_text(staging, 'jsonl', numbers, columns, workers, resume)
+    if failed:
+        return failed
+    schema = pa.schema([(c, pa.list_(pa.string()) if c == 'compound' else pa.string()) for c in columns])
+    with pq.ParquetWriter(path, schema) as writer, open(staging, 'r', encoding='utf-8') as file:
+        batch = []
+        for line in file:
+            batch.append(json.loads(line))
+            if len(batch) >= CHUNK * 8:
+                writer.write_table(pa.Table.from_pylist(batch, schema))
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema))
+    os.remove(staging)
+    _Progress(staging).clear()
+    return failed
+
+
+def export(path, fmt=None, columns=None, workers=8, resume=True):
+    # 返回写出的元素个数; 有元素查询失败时抛出RuntimeError, 重新运行会只补查失败的元素
+    fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower()
+    if fmt not in FORMATS:
+        raise ValueError('unsupported export format: {!r}'.format(fmt))
+    columns = list(columns or FIELDS)
+    unknown = [c for c in columns if c not in FIELDS]
+    if unknown:
+        raise ValueError('unknown columns: ' + ', '.join(unknown))
+    numbers = ele_numbers()
+    if fmt == 'parquet':
+        failed = _write_parquet(path, numbers, columns, workers, resume)
+    else:
+        failed = _write_text(path, fmt, numbers, columns, workers, resume)
+    if failed:
+        raise RuntimeError('failed to export elements: ' + ', '.join('{} ({!r})'.format(n, e) for n, e in failed))
+    if fmt != 'parquet':
+        _Progress(path).clear()
+    return len(numbers)
+
+
+def main():
+    # python export.py elements.csv --columns name,number,weight
+    parser = argparse.ArgumentParser(description='export all elements')
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=FORMATS)
+    parser.add_argument('--columns', help='comma separated, default: all of ' + ','.join(FIELDS))
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--no-resume', action='store_true')
+    args = parser.parse_args()
+    columns = args.columns.split(',') if args.columns else None
+    count = export(args.path, args.format, columns, args.workers, not args.no_resume)
+    print('exported {} elements to {}'.format(count, args.path), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+import re
+import math
+from array import array
+from functools import lru_cache
+
+# 大多数化学式没有括号, 结晶水和电荷, 用一次findall即可
+_SIMPLE = re.compile(r'(?:[A-Z][a-z]*\d*)+')
+_SIMPLE_TOKEN = re.compile(r'([A-Z][a-z]*)(\d*)')
+_TOKEN = re.compile(r'([A-Z][a-z]*)|(\d+)|([(\[])|([)\]])')
+_CLOSE = {'(': ')', '[': ']'}
+# 结晶水等加合物的分隔符, 例如 CuSO4·5H2O, CuSO4.5H2O, CuSO4*5H2O
+_ADDUCT = re.compile(r'[·•∙*.]')
+_COEFFICIENT = re.compile(r'\s*(\d+)\s*')
+_CHARGE = re.compile(r'^(?:(\d*)([+-])|([+-]+)|([+-])(\d+))$')
+_TRAILING_SIGNS = re.compile(r'[+-]+$')
+
+
+def split_charge(formula):
+    # 返回 (不含电荷的部分, 电荷); 支持 SO4^2-, NH4^+, Fe^+3, 以及不带'^'时末尾的正负号 NH4+, SO4--
+    text = formula.strip()
+    if '^' in text:
+        text, _, charge = text.partition('^')
+        match = _CHARGE.match(charge.strip())
+        if match is None:
+            raise ValueError('invalid charge: {!r}'.format(formula))
+        digits, sign, signs, sign2, digits2 = match.groups()
+        if signs:
+            return text, len(signs) if signs[0] == '+' else -len(signs)
+        n = int(digits or digits2 or 1)
+        return text, n if (sign or sign2) == '+' else -n
+    match = _TRAILING_SIGNS.search(text)
+    if match is None:
+        return text, 0
+    signs = match.group()
+    if len(set(signs)) != 1:
+        raise ValueError('invalid charge: {!r}'.format(formula))
+    return text[:match.start()], len(signs) if signs[0] == '+' else -len(signs)
+
+
+def _parse_group(text, formula):
+    # 返回 {元素符号: 原子个数}, 支持括号嵌套, 例如 Ca(OH)2, K4[Fe(CN)6]
+    stack = [({}, None)]
+    pos = 0
+    last = None  # 上一个可以跟数字的项: 元素符号或刚闭合的括号
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if match is None:
+            raise ValueError('invalid formula: {!r}'.format(formula))
+        symbol, digits, opening, closing = match.groups()
+        pos = match.end()
+        counts = stack[-1][0]
+        if symbol:
+            counts[symbol] = counts.get(symbol, 0) + 1
+            last = ('symbol', symbol)
+        elif digits:
+            if last is None:
+                raise ValueError('invalid formula: {!r}'.format(formula))
+            n = int(digits)
+            if last[0] == 'symbol':
+                counts[last[1]] += n - 1
+            else:
+                for key, value in last[1].items():
+                    counts[key] = counts.get(key, 0) + value * (n - 1)
+            last = None
+        elif opening:
+            stack.append(({}, opening))
+            last = None
+        else:
+            inner, bracket = stack.pop()
+            if bracket is None or _CLOSE[bracket] != closing:
+                raise ValueError('invalid formula: {!r}'.format(formula))
+            counts = stack[-1][0]
+            for key, value in inner.items():
+                counts[key] = counts.get(key, 0) + value
+            last = ('group', inner)
+    if len(stack) != 1 or not stack[0][0]:
+        raise ValueError('invalid formula: {!r}'.format(formula))
+    return stack[0][0]
+
+
+@lru_cache(maxsize=65536)
+def composition(formula):
+    # 解析结果按化学式缓存; 返回不可变的 ((元素符号, 个数), ...), 按第一次出现的顺序
+    counts = {}
+    if _SIMPLE.fullmatch(formula):
+        for symbol, digits in _SIMPLE_TOKEN.findall(formula):
+            counts[symbol] = counts.get(symbol, 0) + (int(digits) if digits else 1)
+        return tuple(counts.items())
+    text, _ = split_charge(formula)
+    for part in _ADDUCT.split(text):
+        match = _COEFFICIENT.match(part)
+        factor = 1
+        if match is not None:
+            factor = int(match.group(1))
+            part = part[match.end():]
+        for key, value in _parse_group(part.strip(), formula).items():
+            counts[key] = counts.get(key, 0) + value * factor
+    return tuple(counts.items())
+
+
+def parse(formula):
+    return dict(composition(formula))
+
+
+def elements(formula):
+    return {symbol for symbol, _ in composition(formula)}
+
+
+def charge(formula):
+    return split_charge(formula)[1]
+
+
+class MassCalculator:
+    # 用元素表中的原子量计算摩尔质量和质量分数
+    # 单个化学式的解析结果由composition缓存; 批量接口只在一次调用内去重, 不保留处理过的化学式
+    def __init__(self, weights):
+        self.weights = weights
+
+    @classmethod
+    def from_table(cls, table):
+        # table: table.ElementTable; 没有原子量的元素不放进来, 计算时按未知元素处理
+        values, mask = table.values['weight'], table.mask['weight']
+        return cls({name: values[row] for row, name in enumerate(table.names) if mask[row]})
+
+    def _mass(self, formula, counts):
+        weights = self.weights
+        mass = 0.0
+        try:
+            for symbol, count in counts:
+                mass += weights[symbol] * count
+        except KeyError as e:
+            raise ValueError('unknown element {} in {!r}'.format(e.args[0], formula))
+        if mass <= 0:
+            # 例如H0, 能解析但没有原子, 质量分数无法计算
+            raise ValueError('zero molar mass: {!r}'.format(formula))
+        return mass
+
+    def _fractions(self, formula, counts):
+        total = self._mass(formula, counts)
+        return {symbol: self.weights[symbol] * count / total for symbol, count in counts}
+
+    def _batch(self, formulas, compute, invalid):
+        # 大批量互不相同的化学式直接解析, 不经过composition的lru缓存, 避免把交互查询的缓存挤掉
+        parse_formula = composition.__wrapped__
+        seen = {}
+        for formula in formulas:
+            value = seen.get(formula, seen)
+            if value is seen:
+                try:
+                    value = compute(formula, parse_formula(formula))
+                except ValueError:
+                    value = invalid
+                seen[formula] = value
+            yield value
+
+    def molar_mass(self, formula):
+        return self._mass(formula, composition(formula))
+
+    def molar_masses(self, formulas):
+        # 批量计算, 无法解析或含未知元素的化学式结果为nan
+        return array('d', self._batch(formulas, self._mass, math.nan))
+
+    def mass_fractions(self, formula):
+        return self._fractions(formula, composition(formula))
+
+    def mass_fractions_many(self, formulas):
+        # 批量计算质量分数, 与输入顺序一致; 无法解析或含未知元素的化学式结果为None
+        # 同一化学式重复出现时返回的是同一个dict
+        return list(self._batch(formulas, self._fractions, None))
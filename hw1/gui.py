@@ -1,6 +1,114 @@
+import os
 from utils import *
-from query import ele_query
+from PyQt6.QtWidgets import QApplication, QGridLayout, QPushButton, QLineEdit, QLabel, QWidget, QCompleter
+from PyQt6.QtCore import QObject, QRunnable, QThread, QThreadPool, QStringListModel, pyqtSignal
+from query import ele_query, ele_trie, prefetch, snapshot_active, Cancelled
 from element import *
+from information import get_properties
+from table import ElementTable
+from compound import find_compound
+import timing
+import net
+import usage
+
+# 一次查询(包括重试)最多等待的秒数
+QUERY_DEADLINE = 20
+# 启动时预取化合物的元素个数(按历史查询次数)
+PREFETCH_COUNT = 10
+# 预热最多占用的秒数; 比QUERY_DEADLINE短, 用户的第一次查询不会因为等预热持有的缓存锁而超时
+WARMUP_DEADLINE = 15
+
+
+class QuerySignals(QObject):
+    progress = pyqtSignal(int, str)
+    basic = pyqtSignal(int, object)
+    properties = pyqtSignal(int, object)
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str)
+    timing = pyqtSignal(int, object)
+
+
+class QueryTask(QRunnable):
+    # 在线程池中执行查询, 结果通过信号回到界面线程
+    def __init__(self, query_id, name):
+        super().__init__()
+        self.query_id = query_id
+        self.name = name
+        self.cancelled = False
+        self.signals = QuerySignals()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def progress(self, stage):
+        if self.cancelled:
+            raise Cancelled()
+        self.signals.progress.emit(self.query_id, stage)
+
+    def fail(self, message):
+        if not self.cancelled:
+            self.signals.failed.emit(self.query_id, message)
+
+    def timing(self, record):
+        self.signals.timing.emit(self.query_id, record)
+
+    def run(self):
+        # 每组字段加载完就发出一次信号, 界面可以先显示已有的部分
+        elem = None
+        try:
+            with net.deadline(QUERY_DEADLINE), timing.collect(self.name, self.timing):
+                elem = ele_query(self.name, progress=self.progress, lazy=True)
+                self.progress('获取性质和化合物')
+                prefetch(elem)
+                self.signals.basic.emit(self.query_id, elem)
+                elem.resolve(*PROPERTY_FIELDS)
+                self.progress('获取化合物')
+                # 熔点沸点等数值转成列式表的一行, 界面不再解析字符串; 只转换这一个元素, 不依赖整张表
+                self.signals.properties.emit(self.query_id, ElementTable.from_elements([elem]).view(0))
+                elem.resolve('compound')
+        except Cancelled:
+            return
+        except net.NetworkError:
+            self.fail('网络错误, 请稍后重试')
+        except KeyError:
+            self.fail('元素姓名不匹配' if elem is None else '部分数据获取失败')
+        except Exception:
+            self.fail('查询失败' if elem is None else '部分数据获取失败')
+        else:
+            if not self.cancelled:
+                self.signals.finished.emit(self.query_id, elem)
+
+
+class WarmupSignals(QObject):
+    trie = pyqtSignal(object)
+
+
+class WarmupTask(QRunnable):
+    # 启动时在后台下载并解析页面和性质json, 再预取最常查询的元素的化合物
+    # 前缀树建好就先发给界面, 建好之前输入框照常可用; 使用离线快照时不访问网络
+    def __init__(self, prefetch_count=PREFETCH_COUNT):
+        super().__init__()
+        self.prefetch_count = prefetch_count
+        self.cancelled = False
+        self.signals = WarmupSignals()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        try:
+            with net.deadline(WARMUP_DEADLINE):
+                self.signals.trie.emit(ele_trie())
+                if snapshot_active() or self.cancelled:
+                    return
+                get_properties()
+                for symbol in usage.top(self.prefetch_count):
+                    if self.cancelled:
+                        return
+                    find_compound(symbol)
+        except Exception:
+            # 预热失败不影响正常查询, 查询时会再次尝试
+            return
 
 
 class Example(QWidget):
@@ -9,6 +117,7 @@ class Example(QWidget):
         super().__init__()
         self.name_edit = None
         self.elem = None
+        self.view = None
         self.res2 = QLabel('N/A')
         self.res3 = QLabel('N/A')
         self.res4 = QLabel('N/A')
@@ -22,6 +131,20 @@ class Example(QWidget):
         self.res12 = QLabel('N/A')
         self.res13 = QLabel('N/A')
         self.state = QLabel('请输入')
+        # 设置环境变量PTABLE_DEBUG后显示每次查询的分阶段耗时
+        self.debug = QLabel('') if os.environ.get('PTABLE_DEBUG') else None
+        self.pool = QThreadPool.globalInstance()
+        self.task = None
+        self.query_id = 0
+        self.trie = None
+        self.results = {}
+        self.completion_model = QStringListModel()
+        self.warmup = WarmupTask()
+        # 预热用单独的低优先级线程池; 全局线程池的线程会被查询复用, 不能改它们的优先级
+        self.warmup_pool = QThreadPool(self)
+        self.warmup_pool.setMaxThreadCount(1)
+        self.warmup_pool.setThreadPriority(QThread.Priority.LowestPriority)
+        self.heatmap = None
         self.initUI()
 
     def initUI(self):
@@ -30,9 +153,21 @@ class Example(QWidget):
         ok_button = QPushButton('确认')
         label1 = QLabel('请输入元素名,中文名或元素符号均可以')
         ok_button.clicked.connect(self.getinfo)
+        table_button = QPushButton('周期表')
+        table_button.clicked.connect(self.show_heatmap)
         self.name_edit = QLineEdit()
+        self.name_edit.returnPressed.connect(self.getinfo)
+        # 候选由前缀树给出, 补全器本身不再按前缀过滤(中文名和序数补全出来的是元素符号)
+        # 选中候选后输入框的returnPressed会触发查询, 不再连接activated, 否则一次回车会查询两次
+        completer = QCompleter(self.completion_model, self)
+        completer.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        self.name_edit.setCompleter(completer)
+        self.name_edit.textEdited.connect(self.on_edited)
+        self.warmup.signals.trie.connect(self.on_trie)
+        self.warmup_pool.start(self.warmup)
         grid.addWidget(label1, 1, 0)
         grid.addWidget(ok_button, 2, 1)
+        grid.addWidget(table_button, 1, 1)
         grid.addWidget(self.name_edit, 2, 0)
 
         label2 = QLabel('元素名称')
@@ -76,41 +211,138 @@ class Example(QWidget):
         grid.addWidget(self.res12, 14, 1)
         grid.addWidget(self.res13, 15, 1)
         grid.addWidget(self.state, 3, 1)
+        if self.debug is not None:
+            self.debug.setWordWrap(True)
+            grid.addWidget(self.debug, 16, 0, 1, 2)
 
         self.setLayout(grid)
         self.setGeometry(300, 300, 800, 600)
         self.setWindowTitle('元素性质查询器')
         self.show()
 
+    def show_heatmap(self):
+        # 周期表窗口只在第一次打开时创建; 点击元素即查询该元素
+        if self.heatmap is None:
+            from heatmap import HeatmapWindow
+            self.heatmap = HeatmapWindow()
+            self.heatmap.heatmap.element_clicked.connect(self.on_completed)
+        self.heatmap.show()
+        self.heatmap.raise_()
+
+    def closeEvent(self, event):
+        # 线程池销毁时会等待正在执行的任务; 取消预热并清掉还没开始的任务, 关闭窗口时不必等网络
+        self.warmup.cancel()
+        self.warmup_pool.clear()
+        if self.task is not None:
+            self.task.cancel()
+        super().closeEvent(event)
+
+    def on_trie(self, trie):
+        self.trie = trie
+        self.on_edited(self.name_edit.text())
+
+    def on_edited(self, text):
+        if self.trie is None:
+            return
+        text = text.strip()
+        self.completion_model.setStringList(self.trie.complete(text) if text else [])
+        if text:
+            self.name_edit.completer().complete()
+
+    def on_completed(self, text):
+        self.name_edit.setText(text)
+        self.getinfo()
+
     def getinfo(self):
+        # 新的查询会取代仍在进行的旧查询
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        self.query_id += 1
+        # 界面缓存按元素符号保存, 输入的中文名, 英文名或序数先换成符号
+        text = self.name_edit.text().strip()
+        symbol = self.trie.get(text, text) if self.trie is not None else text
+        cached = self.results.get(symbol)
+        if cached is not None:
+            # 查过的元素直接显示, 不再访问网络
+            elem, view = cached
+            if self.debug is not None:
+                self.debug.setText('界面缓存命中')
+            self.on_basic(self.query_id, elem)
+            self.on_properties(self.query_id, view)
+            self.on_finished(self.query_id, elem)
+            return
+        self.task = QueryTask(self.query_id, self.name_edit.text())
+        self.task.signals.progress.connect(self.on_progress)
+        self.task.signals.basic.connect(self.on_basic)
+        self.task.signals.properties.connect(self.on_properties)
+        self.task.signals.finished.connect(self.on_finished)
+        self.task.signals.failed.connect(self.on_failed)
+        self.task.signals.timing.connect(self.on_timing)
         self.state.setText("查询中")
-        QApplication.processEvents()
-        try:
-            self.elem = ele_query(self.name_edit.text())
-        except:
-            self.state.setText('元素姓名不匹配')
+        self.pool.start(self.task)
+
+    def on_progress(self, query_id, stage):
+        if query_id == self.query_id:
+            self.state.setText("查询中: " + stage)
+
+    def on_timing(self, query_id, record):
+        if query_id == self.query_id and self.debug is not None:
+            self.debug.setText(record.summary())
+
+    def on_failed(self, query_id, message):
+        if query_id == self.query_id:
+            self.task = None
+            self.state.setText(message)
+
+    def on_basic(self, query_id, elem):
+        if query_id != self.query_id:
+            return
+        self.elem = elem
+        self.res2.setText(self.elem.name)
+        self.res3.setText(self.elem.number)
+        self.res4.setText(self.elem.weight+"u")
+        for label in (self.res5, self.res6, self.res7, self.res8, self.res9, self.res10, self.res11,
+                      self.res12, self.res13):
+            label.setText('...')
+
+    @staticmethod
+    def celsius(kelvin):
+        if kelvin is None:
+            return 'N/A'
+        text = str(kelvin - 273.15)
+        return text + "°C" if len(text) < 10 else "{:.2f}".format(kelvin - 273.15) + "°C"
+
+    @staticmethod
+    def percent(value):
+        return 'N/A' if value == 'N/A' else str(value) + "%"
+
+    def on_properties(self, query_id, view):
+        # view: table.ElementView, 数值字段已经是float, 缺失为None
+        if query_id != self.query_id:
+            return
+        self.view = view
+        self.res5.setText(self.celsius(view.melting_point))
+        self.res6.setText(self.celsius(view.boiling_point))
+        self.res7.setText(self.percent(self.elem.crust))
+        self.res8.setText(self.percent(self.elem.meteor))
+        self.res9.setText(self.percent(self.elem.ocean))
+        self.res10.setText(self.percent(self.elem.solar))
+        self.res11.setText(self.percent(self.elem.universe))
+        discover = str(self.elem.discover)
+        if discover == 'N/A' or not discover:
+            self.res12.setText('N/A')
         else:
-            self.state.setText("查询成功")
-            self.res2.setText(self.elem.name)
-            self.res3.setText(self.elem.number)
-            self.res4.setText(self.elem.weight+"u")
-            if self.elem.melting_point == 'N/A':
-                self.res5.setText('N/A')
-            else:
-                melting_point = str(float(self.elem.melting_point)-273.15)
-                self.res5.setText(melting_point + "°C" if len(melting_point) < 10 else "{:.2f}".format(float(melting_point)) + "°C")
-            boiling_point = str(float(self.elem.boiling_point)-273.15)
-            self.res6.setText(boiling_point+"°C" if len(boiling_point) < 10 else "{:.2f}".format(float(boiling_point))+"°C")
-            self.res7.setText(self.elem.crust+"%")
-            if self.elem.meteor == 'N/A':
-                self.res8.setText('N/A')
-            else:
-                self.res8.setText(self.elem.meteor+"%")
-            self.res9.setText(self.elem.ocean+"%")
-            self.res10.setText(self.elem.solar+"%")
-            self.res11.setText(self.elem.universe+"%")
-            self.res12.setText('公元'+self.elem.discover+'年' if self.elem.discover[0] != '-' else '公元前'+self.elem.discover[1:]+'年')
-            self.res13.setText(','.join(self.elem.compound))
+            self.res12.setText('公元'+discover+'年' if discover[0] != '-' else '公元前'+discover[1:]+'年')
+
+    def on_finished(self, query_id, elem):
+        if query_id != self.query_id:
+            return
+        self.task = None
+        self.results[elem.name] = (elem, self.view)
+        usage.record(elem.name)
+        self.state.setText("查询成功")
+        self.res13.setText(','.join(self.elem.compound))
 
 
 def main():
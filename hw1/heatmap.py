@@ -0,0 +1,190 @@
+import sys
+import math
+from PyQt6.QtWidgets import QApplication, QWidget, QComboBox, QLabel, QVBoxLayout, QHBoxLayout, QToolTip
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, QRectF, Qt, pyqtSignal
+from PyQt6.QtGui import QColor, QPainter, QFont
+from table import NUMERIC_FIELDS
+from query import ele_table
+
+FIELD_NAMES = {'weight': '原子量', 'melting_point': '熔点', 'boiling_point': '沸点', 'crust': '地壳占比',
+               'meteor': '流星占比', 'ocean': '海洋占比', 'solar': '太阳占比', 'universe': '宇宙占比',
+               'discover': '发现时间'}
+# 丰度跨越很多个数量级, 按对数着色
+LOG_FIELDS = {'crust', 'meteor', 'ocean', 'solar', 'universe'}
+# 颜色表的几个节点(近似viridis), 中间线性插值
+STOPS = ((68, 1, 84), (59, 82, 139), (33, 145, 140), (94, 201, 98), (253, 231, 37))
+MISSING = QColor(200, 200, 200)
+
+
+def grid_position(number):
+    # 原子序数 -> (行, 列), 镧系和锕系放在表下方单独的两行, 中间空一行
+    if number <= 2:
+        return 0, 0 if number == 1 else 17
+    for start, row in ((3, 1), (11, 2)):
+        if number < start + 8:
+            offset = number - start
+            return row, offset if offset < 2 else offset + 10
+    for start, row in ((19, 3), (37, 4)):
+        if number < start + 18:
+            return row, number - start
+    for start, row in ((55, 5), (87, 6)):
+        if number < start + 32:
+            offset = number - start
+            if 2 <= offset < 17:
+                return row + 3, offset + 1
+            return row, offset if offset < 2 else offset - 14
+    return None
+
+
+def colormap(t):
+    t = min(max(t, 0.0), 1.0) * (len(STOPS) - 1)
+    i = min(int(t), len(STOPS) - 2)
+    f = t - i
+    a, b = STOPS[i], STOPS[i + 1]
+    return QColor(*(round(a[k] + (b[k] - a[k]) * f) for k in range(3)))
+
+
+def field_colors(table, field):
+    # 每个元素的颜色, 缺失值为灰色; 只用到表中的数组, 不访问网络
+    values, mask = table.values[field], table.mask[field]
+    scaled = []
+    for row in range(len(table)):
+        value = values[row] if mask[row] else None
+        if value is not None and field in LOG_FIELDS:
+            value = math.log10(value) if value > 0 else None
+        scaled.append(value)
+    present = [v for v in scaled if v is not None]
+    low, high = (min(present), max(present)) if present else (0.0, 0.0)
+    span = high - low or 1.0
+    return [MISSING if v is None else colormap((v - low) / span) for v in scaled]
+
+
+class Heatmap(QWidget):
+    # 整张周期表在一次paintEvent中画完; 各属性的颜色计算一次后缓存
+    element_clicked = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.table = None
+        self.field = NUMERIC_FIELDS[0]
+        self.positions = []
+        self.cells = {}
+        self.colors = {}
+        self.setMouseTracking(True)
+        self.setMinimumSize(18 * 32, 10 * 32)
+
+    def set_table(self, table):
+        self.table = table
+        self.positions = [grid_position(number) for number in table.numbers]
+        self.cells = {position: row for row, position in enumerate(self.positions) if position is not None}
+        self.colors.clear()
+        self.update()
+
+    def set_field(self, field):
+        self.field = field
+        self.update()
+
+    def _colors(self):
+        colors = self.colors.get(self.field)
+        if colors is None:
+            colors = self.colors[self.field] = field_colors(self.table, self.field)
+        return colors
+
+    def _cell(self):
+        return min(self.width() / 18, self.height() / 10)
+
+    def _row_at(self, pos):
+        cell = self._cell()
+        return self.cells.get((int(pos.y() // cell), int(pos.x() // cell)))
+
+    def paintEvent(self, event):
+        if self.table is None:
+            return
+        painter = QPainter(self)
+        cell = self._cell()
+        font = QFont(painter.font())
+        font.setPixelSize(max(8, int(cell * 0.38)))
+        painter.setFont(font)
+        for row, (position, color) in enumerate(zip(self.positions, self._colors())):
+            if position is None:
+                continue
+            rect = QRectF(position[1] * cell + 1, position[0] * cell + 1, cell - 2, cell - 2)
+            painter.fillRect(rect, color)
+            # 按亮度选文字颜色, 浅色格子用黑字
+            luma = 0.299 * color.red() + 0.587 * color.green() + 0.114 * color.blue()
+            painter.setPen(QColor(0, 0, 0) if luma > 140 else QColor(255, 255, 255))
+            painter.drawText(rect, Qt.AlignmentFlag.AlignCenter, self.table.names[row])
+        painter.end()
+
+    def mouseMoveEvent(self, event):
+        row = self._row_at(event.position()) if self.table is not None else None
+        if row is None:
+            QToolTip.hideText()
+            return
+        value = self.table.value(self.field, row)
+        QToolTip.showText(event.globalPosition().toPoint(), '{} {}: {}'.format(
+            self.table.names[row], FIELD_NAMES[self.field], 'N/A' if value is None else '{:g}'.format(value)), self)
+
+    def mousePressEvent(self, event):
+        row = self._row_at(event.position()) if self.table is not None else None
+        if row is not None:
+            self.element_clicked.emit(self.table.names[row])
+
+
+class TableSignals(QObject):
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+
+class TableTask(QRunnable):
+    def __init__(self):
+        super().__init__()
+        self.signals = TableSignals()
+
+    def run(self):
+        try:
+            table = ele_table()
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.finished.emit(table)
+
+
+class HeatmapWindow(QWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.heatmap = Heatmap()
+        self.state = QLabel('加载中')
+        self.field_box = QComboBox()
+        for field in NUMERIC_FIELDS:
+            self.field_box.addItem(FIELD_NAMES[field], field)
+        self.field_box.currentIndexChanged.connect(lambda: self.heatmap.set_field(self.field_box.currentData()))
+        top = QHBoxLayout()
+        top.addWidget(QLabel('属性'))
+        top.addWidget(self.field_box)
+        top.addWidget(self.state)
+        top.addStretch()
+        layout = QVBoxLayout()
+        layout.addLayout(top)
+        layout.addWidget(self.heatmap)
+        self.setLayout(layout)
+        self.setWindowTitle('元素周期表')
+        self.task = TableTask()
+        self.task.signals.finished.connect(self.on_table)
+        self.task.signals.failed.connect(self.state.setText)
+        QThreadPool.globalInstance().start(self.task)
+
+    def on_table(self, table):
+        self.state.setText('')
+        self.heatmap.set_table(table)
+
+
+def main():
+    app = QApplication(sys.argv)
+    window = HeatmapWindow()
+    window.show()
+    sys.exit(app.exec())
+
+
+if __name__ == '__main__':
+    main()
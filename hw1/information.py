@@ -1,25 +1,33 @@
 from utils import *
 from element import *
+import cache
 
+PROPERTIES_URL = "https://ptable.com/JSON/properties-90d5338.json"
 
-def get_information(name, element, num):
-    url = "https://ptable.com/JSON/properties-90d5338.json"
-    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 (KHTML, like Gecko)\
-    Chrome/55.0.2883.87 Safari/537.36'}
-    r = requests.get(url, headers=headers)
-    hjson = json.loads(r.text)
-    # 稀有气体没有熔点
-    try:
-        element.melting_point = hjson[num]['melt']
-    except:
-        element.melting_point = 'N/A'
-    element.boiling_point = hjson[num]['boil']
-    element.crust = hjson[num]["abundance"]['crust']
-    try:
-        element.meteor = hjson[num]["abundance"]['meteor']
-    except:
-        element.meteor = 'N/A'
-    element.ocean = hjson[num]["abundance"]['ocean']
-    element.solar = hjson[num]["abundance"]['solar']
-    element.universe = hjson[num]["abundance"]['universe']
-    element.discover = hjson[num]["discover"]
\ No newline at end of file
+
+def get_properties(refresh=False):
+    # 整个json只下载解析一次, 之后每次查询都是字典访问
+    return cache.fetch_json(PROPERTIES_URL, refresh=refresh, stage='properties')
+
+
+def get_information(name, element, num, refresh=False):
+    fill_information(element, get_properties(refresh), num)
+
+
+def _value(data, key):
+    value = data.get(key)
+    return 'N/A' if value is None else value
+
+
+def fill_information(element, hjson, num):
+    # 稀有气体没有熔点, 部分元素也没有沸点, 丰度或发现时间, 缺失的字段记为N/A
+    data = hjson[num]
+    abundance = data.get('abundance') or {}
+    element.melting_point = _value(data, 'melt')
+    element.boiling_point = _value(data, 'boil')
+    element.crust = _value(abundance, 'crust')
+    element.meteor = _value(abundance, 'meteor')
+    element.ocean = _value(abundance, 'ocean')
+    element.solar = _value(abundance, 'solar')
+    element.universe = _value(abundance, 'universe')
+    element.discover = _value(data, 'discover')
@@ -0,0 +1,96 @@
+import time
+import random
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# (连接超时, 读取超时), 单位秒
+TIMEOUT = (3.05, 15)
+# 连接失败, 超时和5xx/429时的重试次数, 第n次重试前随机等待 0 ~ BACKOFF * 2**n 秒
+RETRIES = 2
+BACKOFF = 0.3
+RETRY_STATUS = {429, 500, 502, 503, 504}
+headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 (KHTML, like Gecko)\
+    Chrome/55.0.2883.87 Safari/537.36'}
+
+_session = None
+_lock = threading.Lock()
+_deadline = contextvars.ContextVar('net_deadline', default=None)
+
+
+class NetworkError(Exception):
+    # 重试后仍然连不上, 超时或服务器出错
+    def __init__(self, url, reason):
+        super().__init__('{}: {}'.format(url, reason))
+        self.url = url
+        self.reason = reason
+
+
+def get_session():
+    # 所有请求共用一个连接池, 复用keep-alive连接
+    # requests在第一次真正访问网络时才导入, 只读缓存的命令行查询不需要它
+    global _session
+    with _lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update(headers)
+            _session = session
+    return _session
+
+
+@contextmanager
+def deadline(seconds):
+    # 限制一段代码中所有请求(包括重试和等待)的总时间; 嵌套时取更早的截止时间
+    end = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(end if outer is None else min(outer, end))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    # 当前截止时间还剩的秒数, 没有设置截止时间时为None
+    end = _deadline.get()
+    return None if end is None else max(0.0, end - time.monotonic())
+
+
+def get(url, headers=None, timeout=TIMEOUT, retries=RETRIES):
+    import requests
+    end = _deadline.get()
+    attempt = 0
+    while True:
+        attempt_timeout = timeout
+        if end is not None:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                raise NetworkError(url, 'deadline exceeded')
+            attempt_timeout = (min(timeout[0], remaining), min(timeout[1], remaining))
+        try:
+            r = get_session().get(url, headers=headers, timeout=attempt_timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            reason = e
+        else:
+            if r.status_code not in RETRY_STATUS:
+                return r
+            reason = 'HTTP {}'.format(r.status_code)
+        if attempt >= retries:
+            raise NetworkError(url, reason)
+        delay = random.uniform(0, BACKOFF * 2 ** attempt)
+        if end is not None and time.monotonic() + delay >= end:
+            raise NetworkError(url, reason)
+        time.sleep(delay)
+        attempt += 1
+
+
+def mount(adapter):
+    # 替换会话的传输层, 例如用replay.ReplayAdapter离线回放
+    session = get_session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
@@ -0,0 +1,183 @@
+from utils import *
+from html.parser import HTMLParser
+import cache
+
+PAGE_URL = "https://ptable.com/?lang=zh-hans#%E6%80%A7%E8%B4%A8/%E7%B3%BB%E5%88%97"
+# 页面是中文版, 英文名按原子序数排列, 用于输入补全
+ENGLISH_NAMES = ('Hydrogen', 'Helium', 'Lithium', 'Beryllium', 'Boron', 'Carbon', 'Nitrogen',
+                 'Oxygen', 'Fluorine', 'Neon', 'Sodium', 'Magnesium', 'Aluminium', 'Silicon',
+                 'Phosphorus', 'Sulfur', 'Chlorine', 'Argon', 'Potassium', 'Calcium', 'Scandium',
+                 'Titanium', 'Vanadium', 'Chromium', 'Manganese', 'Iron', 'Cobalt', 'Nickel',
+                 'Copper', 'Zinc', 'Gallium', 'Germanium', 'Arsenic', 'Selenium', 'Bromine',
+                 'Krypton', 'Rubidium', 'Strontium', 'Yttrium', 'Zirconium', 'Niobium',
+                 'Molybdenum', 'Technetium', 'Ruthenium', 'Rhodium', 'Palladium', 'Silver',
+                 'Cadmium', 'Indium', 'Tin', 'Antimony', 'Tellurium', 'Iodine', 'Xenon', 'Caesium',
+                 'Barium', 'Lanthanum', 'Cerium', 'Praseodymium', 'Neodymium', 'Promethium',
+                 'Samarium', 'Europium', 'Gadolinium', 'Terbium', 'Dysprosium', 'Holmium',
+                 'Erbium', 'Thulium', 'Ytterbium', 'Lutetium', 'Hafnium', 'Tantalum', 'Tungsten',
+                 'Rhenium', 'Osmium', 'Iridium', 'Platinum', 'Gold', 'Mercury', 'Thallium', 'Lead',
+                 'Bismuth', 'Polonium', 'Astatine', 'Radon', 'Francium', 'Radium', 'Actinium',
+                 'Thorium', 'Protactinium', 'Uranium', 'Neptunium', 'Plutonium', 'Americium',
+                 'Curium', 'Berkelium', 'Californium', 'Einsteinium', 'Fermium', 'Mendelevium',
+                 'Nobelium', 'Lawrencium', 'Rutherfordium', 'Dubnium', 'Seaborgium', 'Bohrium',
+                 'Hassium', 'Meitnerium', 'Darmstadtium', 'Roentgenium', 'Copernicium', 'Nihonium',
+                 'Flerovium', 'Moscovium', 'Livermorium', 'Tennessine', 'Oganesson')
+
+
+class _Node:
+    __slots__ = ('name', 'children')
+
+    def __init__(self, name):
+        self.name = name
+        self.children = []
+
+    def find(self, name):
+        # 和bs4的tag.b一样, 返回第一个同名的后代
+        for child in self.children:
+            if isinstance(child, _Node):
+                if child.name == name:
+                    return child
+                found = child.find(name)
+                if found is not None:
+                    return found
+        return None
+
+    @property
+    def string(self):
+        # 和bs4的tag.string一样: 只有一个子节点时才有值
+        if len(self.children) != 1:
+            return None
+        child = self.children[0]
+        return child.string if isinstance(child, _Node) else child
+
+
+class _Done(Exception):
+    pass
+
+
+class _PtableParser(HTMLParser):
+    # 只为#Ptable子树建节点, 子树结束后立即停止解析
+    VOID = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack = []
+        self.abbrs = []
+
+    def handle_starttag(self, tag, attrs):
+        if not self.stack:
+            if dict(attrs).get('id') != 'Ptable':
+                return
+        node = _Node(tag)
+        if self.stack:
+            self.stack[-1].children.append(node)
+        if tag == 'abbr':
+            self.abbrs.append((node, self.stack[-1] if self.stack else None))
+        if tag not in self.VOID:
+            self.stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in self.VOID and self.stack:
+            self.stack.pop()
+
+    def handle_endtag(self, tag):
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i].name == tag:
+                del self.stack[i:]
+                if not self.stack:
+                    raise _Done()
+                return
+
+    def handle_data(self, data):
+        if self.stack:
+            children = self.stack[-1].children
+            # bs4会把相邻的文本合并成一个字符串
+            if children and isinstance(children[-1], str):
+                children[-1] += data
+            else:
+                children.append(data)
+
+
+def _cells_fast(html):
+    start = html.find('id="Ptable"')
+    if start < 0:
+        start = html.find("id='Ptable'")
+    if start < 0:
+        raise ValueError('#Ptable not found')
+    parser = _PtableParser()
+    try:
+        parser.feed(html[html.rfind('<', 0, start):])
+        parser.close()
+    except _Done:
+        pass
+    if not parser.abbrs:
+        raise ValueError('#Ptable not found')
+    return parser.abbrs
+
+
+def _cells_bs4(html):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    element_table = soup.find_all(id='Ptable')  # elements' name can be only find in this part
+    return [(abbr, abbr.parent) for abbr in element_table[0].find_all("abbr")]
+
+
+def _text(value):
+    return None if value is None else str(value)
+
+
+def extract_records(html, fast=True):
+    # fast: 只解析#Ptable一段; 页面结构不符合预期时退回到完整的bs4解析
+    cells = None
+    if fast:
+        try:
+            cells = _cells_fast(html)
+        except ValueError:
+            cells = None
+    if cells is None:
+        cells = _cells_bs4(html)
+    records = []
+    for abbr, cell in cells:
+        if cell is None:
+            continue
+        b, em, data = cell.find('b'), cell.find('em'), cell.find('data')
+        if b is None or data is None:
+            continue
+        # 转成普通str, 记录里不再引用整棵解析树
+        record = {'symbol': _text(abbr.string),
+                  'name': _text(em.string) if em is not None else None,
+                  'number': _text(b.string),
+                  'weight': _text(data.string)}
+        if record['number'] and record['number'].isdigit() and int(record['number']) <= len(ENGLISH_NAMES):
+            record['english'] = ENGLISH_NAMES[int(record['number']) - 1]
+        records.append(record)
+    return records
+
+
+class ElementNotFound(KeyError):
+    # 名称, 符号或序数找不到对应的元素; 其他KeyError是数据本身的问题
+    pass
+
+
+def build_index(html, fast=True):
+    records = extract_records(html, fast)
+    index = {}
+    for record in records:
+        # 和原来的find_all一样, 同名时以第一次出现的为准
+        for key in (record['symbol'], record['name'], record['number'], record.get('english')):
+            if key:
+                index.setdefault(key, record)
+    return {'records': records, 'index': index}
+
+
+def get_index(refresh=False):
+    # 页面内容不变时只解析一次
+    return cache.fetch_parsed(PAGE_URL, build_index, refresh=refresh, stage='page')
+
+
+def lookup(name, refresh=False):
+    try:
+        return get_index(refresh)['index'][name.strip()]
+    except KeyError:
+        raise ElementNotFound(name) from None
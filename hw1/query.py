@@ -1,38 +1,201 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
 from utils import *
 from element import *
 from information import *
 from compound import *
+from ptable import lookup, get_index, ENGLISH_NAMES
+from table import ElementTable
+from trie import build_trie
+import snapshot
+import timing
 
+# 性质和化合物两个请求互不依赖, 拿到元素符号后同时发出
+_pool = ThreadPoolExecutor(max_workers=4)
+_snapshot = None
+# (数据源, 结果); 保留数据源对象本身并用is比较, 旧对象被回收后id可能被新对象复用
+_table = ((), None)
+_trie = ((), None)
 
-def ele_query(name):
-    url = "https://ptable.com/?lang=zh-hans#%E6%80%A7%E8%B4%A8/%E7%B3%BB%E5%88%97"
-    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 (KHTML, like Gecko)\
-    Chrome/55.0.2883.87 Safari/537.36'}
-    r = requests.get(url, headers=headers)
-    soup = BeautifulSoup(r.text, "html.parser")
-    soup.prettify()
-    element_table = soup.find_all(id='Ptable')  # elements' name can be only find in this part
-    if 'a' <= name[0] <= 'z' or 'A' <= name[0] <= 'Z':
-        element_infor = element_table[0].find_all("abbr", string=name)
-    else:
-        # the result of find_all is list,so it should be taken the first element
-        element_infor = element_table[0].find_all("em", string=name)
-        # for the sake of line feed, use previous_sibling two times
-        name = element_infor[0].previous_sibling.previous_sibling.string
-    element_infor = element_infor[0].parent
-    # get element number
-    ele_num = element_infor.b.string
-    ele_wei = element_infor.data.string
-    element = Element(name, ele_num, ele_wei)
-    get_information(name, element, int(ele_num))
-    element.compound = find_compound(name)
+
+def use_snapshot(path=snapshot.DEFAULT_PATH):
+    # 设置后所有查询都只从离线快照中回答
+    global _snapshot
+    _snapshot = snapshot.load(path) if path else None
+
+
+def snapshot_active():
+    return _snapshot is not None
+
+
+class Cancelled(Exception):
+    pass
+
+
+def _report(progress, stage):
+    # progress回调可以抛出Cancelled来中止查询
+    if progress is not None:
+        progress(stage)
+
+
+def _lazy_element(record):
+    # 名称, 序数和重量在索引里已经有了; 性质和化合物两组字段第一次访问时才加载
+    symbol = record['symbol']
+    element = Element(symbol, record['number'], record['weight'])
+    element.defer(PROPERTY_FIELDS, lambda: get_information(symbol, element, int(record['number'])))
+    element.defer(('compound',), lambda: setattr(element, 'compound', find_compound(symbol)))
+    return element
+
+
+def prefetch(element, *fields):
+    # 在线程池中同时开始加载还没加载的字段, 默认全部
+    element.start(_pool, *fields)
+
+
+def ele_query(name, progress=None, timings=None, lazy=False):
+    # timings: 查询结束后以timing.Record为参数调用, 记录各阶段耗时, 传输字节数和缓存命中情况
+    # lazy: 查到元素后立即返回, 其余字段在第一次访问时加载
+    with timing.collect(name, timings):
+        if _snapshot is not None:
+            with timing.stage('snapshot'):
+                return _snapshot.element(name)
+        _report(progress, '查找元素')
+        with timing.stage('lookup'):
+            element = _lazy_element(lookup(name))
+        if lazy:
+            return element
+        _report(progress, '获取性质和化合物')
+        prefetch(element)
+        element.resolve(*PROPERTY_FIELDS)
+        _report(progress, '获取化合物')
+        element.resolve('compound')
+        return element
+
+
+def _build_element(record, hjson):
+    element = Element(record['symbol'], record['number'], record['weight'])
+    fill_information(element, hjson, int(record['number']))
+    element.compound = find_compound(record['symbol'])
     return element
 
 
+def ele_query_many(names, workers=8):
+    # 返回结果与输入顺序一致, 查询失败的位置放的是对应的异常而不是Element
+    if _snapshot is not None:
+        result = []
+        for name in names:
+            try:
+                result.append(_snapshot.element(name))
+            except Exception as e:
+                result.append(e)
+        return result
+    records = {}
+    for name in dict.fromkeys(names):
+        try:
+            records[name] = lookup(name)
+        except Exception as e:
+            records[name] = e
+    # 符号和中文名指向同一元素时只查询一次
+    symbols = {r['symbol']: r for r in records.values() if not isinstance(r, Exception)}
+    try:
+        hjson = get_properties() if symbols else None
+    except Exception as e:
+        # 性质json获取失败时, 和页面获取失败一样记到每个查到的元素上
+        return [records[name] if isinstance(records[name], Exception) else e for name in names]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {symbol: pool.submit(_build_element, record, hjson) for symbol, record in symbols.items()}
+    elements = {}
+    for symbol, future in futures.items():
+        try:
+            elements[symbol] = future.result()
+        except Exception as e:
+            elements[symbol] = e
+    result = []
+    for name in names:
+        record = records[name]
+        result.append(record if isinstance(record, Exception) else elements[record['symbol']])
+    return result
+
+
+def ele_numbers():
+    # 表中全部元素的原子序数, 按页面顺序
+    if _snapshot is not None:
+        return [item['number'] for item in _snapshot.elements]
+    return list(dict.fromkeys(r['number'] for r in get_index()['records']))
+
+
+def _same(sources, key):
+    return len(sources) == len(key) and all(a is b for a, b in zip(sources, key))
+
+
+def ele_table():
+    # 只需要页面和性质json, 不查化合物; 数据源不变时复用同一张表
+    global _table
+    if _snapshot is not None:
+        key = (_snapshot,)
+        if not _same(_table[0], key):
+            elements = [_snapshot.element(item['number']) for item in _snapshot.elements]
+            _table = (key, ElementTable.from_elements(elements))
+        return _table[1]
+    index = get_index()
+    hjson = get_properties()
+    key = (index, hjson)
+    if not _same(_table[0], key):
+        elements = []
+        for record in dict((r['number'], r) for r in index['records']).values():
+            element = Element(record['symbol'], record['number'], record['weight'])
+            fill_information(element, hjson, int(record['number']))
+            elements.append(element)
+        _table = (key, ElementTable.from_elements(elements))
+    return _table[1]
+
+
+def ele_trie():
+    # 输入补全用的前缀树, 和ele_table一样在数据源不变时只建一次
+    global _trie
+    if _snapshot is not None:
+        key = (_snapshot,)
+        if not _same(_trie[0], key):
+            records = []
+            for item in _snapshot.elements:
+                number = int(item['number'])
+                records.append({'symbol': item['name'], 'name': item['name_zh'], 'number': item['number'],
+                                'english': ENGLISH_NAMES[number - 1] if number <= len(ENGLISH_NAMES) else None})
+            _trie = (key, build_trie(records))
+        return _trie[1]
+    index = get_index()
+    key = (index,)
+    if not _same(_trie[0], key):
+        _trie = (key, build_trie(index['records']))
+    return _trie[1]
+
+
+if os.environ.get('PTABLE_SNAPSHOT'):
+    use_snapshot(os.environ['PTABLE_SNAPSHOT'])
+
+
 def main():
-    name = 'Pb'
-    element = ele_query(name)
-    element.print()
+    # python query.py [names...] [--timings FILE]  每次查询的计时记录以一行json追加到FILE, '-'表示标准输出
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('names', nargs='*', default=['Pb'])
+    parser.add_argument('--timings', metavar='FILE')
+    args = parser.parse_args()
+    out = None
+    if args.timings:
+        out = sys.stdout if args.timings == '-' else open(args.timings, 'a', encoding='utf-8')
+
+    def dump(record):
+        out.write(json.dumps(record.to_dict(), ensure_ascii=False) + '\n')
+        out.flush()
+
+    try:
+        for name in args.names:
+            element = ele_query(name, timings=dump if out is not None else None)
+            element.print()
+    finally:
+        if out is not None and out is not sys.stdout:
+            out.close()
 
 
 if __name__ == '__main__':
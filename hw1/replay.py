@@ -0,0 +1,93 @@
+import os
+import json
+import time
+import base64
+import random
+import hashlib
+import threading
+from requests import Response
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.exceptions import ConnectionError
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+# 只保留缓存和解码需要的响应头
+KEPT_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+
+def _path(url, fixture_dir):
+    return os.path.join(fixture_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.json')
+
+
+class RecordAdapter(HTTPAdapter):
+    # 正常访问网络, 同时把成功的响应写成fixture
+    def __init__(self, fixture_dir=FIXTURE_DIR, **kwargs):
+        super().__init__(**kwargs)
+        self.fixture_dir = fixture_dir
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        if response.status_code == 200:
+            fixture = {'url': request.url,
+                       'status': response.status_code,
+                       'headers': {k: response.headers[k] for k in KEPT_HEADERS if k in response.headers},
+                       'body': base64.b64encode(response.content).decode('ascii')}
+            os.makedirs(self.fixture_dir, exist_ok=True)
+            path = _path(request.url, self.fixture_dir)
+            with open(path + '.tmp', 'w', encoding='utf-8') as file:
+                json.dump(fixture, file)
+            os.replace(path + '.tmp', path)
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    # 从fixture回答请求, 不访问网络; latency和jitter单位为秒, 用来模拟网络延迟
+    def __init__(self, fixture_dir=FIXTURE_DIR, latency=0.0, jitter=0.0, seed=None):
+        super().__init__()
+        self.fixture_dir = fixture_dir
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        self._fixtures = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _fixture(self, url):
+        with self._lock:
+            fixture = self._fixtures.get(url)
+        if fixture is None:
+            try:
+                with open(_path(url, self.fixture_dir), 'r', encoding='utf-8') as file:
+                    fixture = json.load(file)
+            except OSError:
+                raise ConnectionError('no fixture recorded for ' + url)
+            fixture['body'] = base64.b64decode(fixture['body'])
+            with self._lock:
+                self._fixtures[url] = fixture
+        return fixture
+
+    def send(self, request, **kwargs):
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+        fixture = self._fixture(request.url)
+        response = Response()
+        response.url = request.url
+        response.request = request
+        response.headers = CaseInsensitiveDict(fixture['headers'])
+        etag = fixture['headers'].get('ETag')
+        if etag and request.headers.get('If-None-Match') == etag:
+            response.status_code = 304
+            response._content = b''
+        else:
+            response.status_code = fixture['status']
+            response._content = fixture['body']
+        response.reason = 'OK' if response.status_code == 200 else 'Not Modified'
+        response.encoding = get_encoding_from_headers(response.headers)
+        return response
+
+    def close(self):
+        pass
@@ -0,0 +1,212 @@
+import sys
+import json
+import time
+import asyncio
+import argparse
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+import net
+import query
+import compound
+from ptable import ElementNotFound
+from table import NUMERIC_FIELDS
+
+# 本地json查询服务, 所有工具共用同一份进程内缓存
+#   GET /element?name=Pb
+#   GET /elements?names=H,O,Fe
+#   GET /filter?field=boiling_point&low=300&high=1000&order_by=crust&reverse=1&limit=10
+#   GET /compounds?symbols=Fe,O&k=5
+HOST = '127.0.0.1'
+PORT = 8765
+# 查询结果在服务内缓存的秒数; 底层的页面和json仍然由cache模块按各自的TTL管理
+RESULT_TTL = 60
+# 最多缓存的查询结果个数, 超出时淘汰最久没有用到的; key来自客户端参数, 不能无限增长
+RESULT_LIMIT = 1024
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           500: 'Internal Server Error', 502: 'Bad Gateway', 503: 'Service Unavailable'}
+
+
+class Service:
+    def __init__(self, workers=8, limit=RESULT_LIMIT):
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.results = OrderedDict()
+        self.limit = limit
+        self.inflight = {}
+        self.upstream = 0
+
+    async def coalesce(self, key, fn, *args):
+        # 同一个key同时只有一个任务在线程池里执行, 其余请求等待同一个结果
+        # 用shield等待, 某个客户端断开时不会取消其他请求共享的任务
+        cached = self.results.get(key)
+        if cached is not None:
+            if time.monotonic() - cached[0] < RESULT_TTL:
+                self.results.move_to_end(key)
+                return cached[1]
+            del self.results[key]
+        future = self.inflight.get(key)
+        if future is None:
+            self.upstream += 1
+            future = asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+            self.inflight[key] = future
+            future.add_done_callback(lambda f: self._done(key, f))
+        return await asyncio.shield(future)
+
+    def _done(self, key, future):
+        del self.inflight[key]
+        if not future.cancelled() and future.exception() is None:
+            now = time.monotonic()
+            self.results[key] = (now, future.result())
+            self.results.move_to_end(key)
+            # 从最久没用的一端淘汰: 先去掉已经过期的, 再把总数压到上限以内
+            while self.results:
+                oldest = next(iter(self.results.values()))
+                if len(self.results) <= self.limit and now - oldest[0] < RESULT_TTL:
+                    break
+                self.results.popitem(last=False)
+
+    async def element(self, name):
+        return await self.coalesce(('element', name), lambda: query.ele_query(name).to_dict())
+
+    async def handle(self, path, params):
+        if path == '/element':
+            return await self.element(_param(params, 'name'))
+        if path == '/elements':
+            names = [n for n in _param(params, 'names').split(',') if n]
+            results = await asyncio.gather(*(self.element(n) for n in names), return_exceptions=True)
+            return [{'error': _error(r)[1]} if isinstance(r, Exception) else r for r in results]
+        if path == '/filter':
+            return await self.filter(params)
+        if path == '/compounds':
+            symbols = tuple(s for s in _param(params, 'symbols').split(',') if s)
+            k = _number(params, 'k', int)
+            if len(symbols) == 1:
+                return await self.coalesce(('compounds', symbols, k), compound.find_compound, symbols[0], k or 3)
+            return await self.coalesce(('compounds', symbols, k), compound.find_compounds_with, symbols, k)
+        raise HTTPError(404, 'unknown path: ' + path)
+
+    async def filter(self, params):
+        field = params.get('field', [None])[0]
+        order_by = params.get('order_by', [None])[0]
+        for name in (field, order_by):
+            if name is not None and name not in NUMERIC_FIELDS:
+                raise HTTPError(400, 'not a numeric field: ' + name)
+        table = await self.coalesce(('table',), query.ele_table)
+        views = table.select(field, _number(params, 'low', float), _number(params, 'high', float),
+                             order_by, params.get('reverse', ['0'])[0] not in ('0', 'false', ''))
+        limit = _number(params, 'limit', int)
+        if limit is not None:
+            views = views[:limit]
+        fields = [f for f in (field, order_by) if f is not None]
+        return [dict({'name': v.name, 'number': v.number}, **{f: v.value(f) for f in fields}) for v in views]
+
+
+def _param(params, name):
+    if name not in params:
+        raise HTTPError(400, 'missing parameter: ' + name)
+    return params[name][0]
+
+
+def _number(params, name, kind):
+    if name not in params:
+        return None
+    try:
+        return kind(params[name][0])
+    except ValueError:
+        raise HTTPError(400, 'invalid {}: {}'.format(name, params[name][0]))
+
+
+def _error(e):
+    if isinstance(e, HTTPError):
+        return e.status, str(e)
+    if isinstance(e, ElementNotFound):
+        return 404, 'no such element: {}'.format(e.args[0] if e.args else '')
+    if isinstance(e, net.NetworkError):
+        return 502, str(e)
+    if isinstance(e, KeyError):
+        # 数据里缺少字段, 不是客户端的问题
+        return 500, 'missing data: {}'.format(e.args[0] if e.args else '')
+    if isinstance(e, LookupError):
+        return 503, str(e)
+    if isinstance(e, ValueError):
+        return 400, str(e)
+    return 500, '{}: {}'.format(type(e).__name__, e)
+
+
+async def _serve_connection(service, reader, writer):
+    # 只实现GET和keep-alive, 够本地工具使用
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            keep_alive = True
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                key, _, value = line.decode('latin-1').partition(':')
+                if key.strip().lower() == 'connection' and value.strip().lower() == 'close':
+                    keep_alive = False
+            parts = request_line.decode('latin-1').split()
+            try:
+                if len(parts) != 3:
+                    raise HTTPError(400, 'bad request line')
+                if parts[0] != 'GET':
+                    raise HTTPError(405, 'only GET is supported')
+                url = urlsplit(parts[1])
+                status, body = 200, await service.handle(url.path, parse_qs(url.query))
+            except Exception as e:
+                status, message = _error(e)
+                body = {'error': message}
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            writer.write('HTTP/1.1 {} {}\r\nContent-Type: application/json; charset=utf-8\r\n'
+                         'Content-Length: {}\r\nConnection: {}\r\n\r\n'.format(
+                             status, REASONS.get(status, ''), len(data),
+                             'keep-alive' if keep_alive else 'close').encode('latin-1') + data)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start(service=None, host=HOST, port=PORT):
+    service = service or Service()
+    return await asyncio.start_server(lambda r, w: _serve_connection(service, r, w), host, port)
+
+
+def main():
+    # python server.py [--host HOST] [--port PORT] [--snapshot PATH]
+    parser = argparse.ArgumentParser(description='local JSON service for element lookups')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--snapshot', metavar='PATH')
+    args = parser.parse_args()
+    if args.snapshot:
+        query.use_snapshot(args.snapshot)
+
+    async def run():
+        server = await start(host=args.host, port=args.port)
+        print('serving on http://{}:{}'.format(args.host, args.port), file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import os
+import sys
+import json
+import time
+from element import Element
+from ptable import ENGLISH_NAMES, ElementNotFound
+
+VERSION = 1
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ptable-snapshot.json')
+
+
+class Snapshot:
+    def __init__(self, data):
+        if data.get('version') != VERSION:
+            raise ValueError('unsupported snapshot version: {}'.format(data.get('version')))
+        self.created = data['created']
+        self.elements = data['elements']
+        self.index = {}
+        for item in self.elements:
+            # 和在线索引一样也接受英文名
+            number = item['number']
+            english = ENGLISH_NAMES[int(number) - 1] if number and number.isdigit() and int(number) <= len(ENGLISH_NAMES) else None
+            for key in (item['name'], item['name_zh'], number, english):
+                if key:
+                    self.index.setdefault(key, item)
+
+    def lookup(self, name):
+        try:
+            return self.index[name.strip()]
+        except KeyError:
+            raise ElementNotFound(name) from None
+
+    def element(self, name):
+        item = self.lookup(name)
+        return Element.from_dict({k: v for k, v in item.items() if k != 'name_zh'})
+
+
+def load(path=DEFAULT_PATH):
+    # 整个快照只需要一次读取和一次json解析, 之后的查询不访问网络
+    with open(path, 'r', encoding='utf-8') as file:
+        return Snapshot(json.load(file))
+
+
+def build(path=DEFAULT_PATH, workers=8):
+    # 返回 (写入的元素个数, 查询失败的元素列表); 查询失败的元素仍然写入, 页面以外的字段记为N/A
+    import query
+    from ptable import get_index
+    from element import PROPERTY_FIELDS
+    # 总是从网络重新构建, 不读取PTABLE_SNAPSHOT指定的旧快照
+    previous = query._snapshot
+    query.use_snapshot(None)
+    try:
+        records = get_index()['records']
+        numbers = list(dict.fromkeys(r['number'] for r in records))
+        elements = query.ele_query_many(numbers, workers)
+    finally:
+        query._snapshot = previous
+    by_number = {}
+    for record in records:
+        by_number.setdefault(record['number'], record)
+    failed = []
+    items = []
+    for number, element in zip(numbers, elements):
+        record = by_number[number]
+        if isinstance(element, Exception):
+            failed.append((number, element))
+            element = Element(record['symbol'], record['number'], record['weight'])
+            for field in PROPERTY_FIELDS:
+                setattr(element, field, 'N/A')
+        item = element.to_dict()
+        item['name_zh'] = record['name']
+        items.append(item)
+    data = {'version': VERSION, 'created': time.time(), 'elements': items}
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+    return len(items), failed
+
+
+def main():
+    # python snapshot.py [path]
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH
+    count, failed = build(path)
+    print('wrote {} elements to {}'.format(count, path))
+    if failed:
+        print('incomplete data for: ' + ', '.join('{} ({!r})'.format(n, e) for n, e in failed), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+from array import array
+
+# 可以按数值筛选和排序的列, 缺失值在mask中记为0
+NUMERIC_FIELDS = ('weight', 'melting_point', 'boiling_point', 'crust', 'meteor',
+                  'ocean', 'solar', 'universe', 'discover')
+
+
+def to_float(value):
+    # 放射性元素的原子量形如[209], 稀有气体的熔点为N/A
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = str(value).strip().strip('[]()')
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+class ElementView:
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    @property
+    def name(self):
+        return self.table.names[self.row]
+
+    @property
+    def number(self):
+        return self.table.numbers[self.row]
+
+    def value(self, field):
+        return self.table.value(field, self.row)
+
+    def __getattr__(self, field):
+        if field in NUMERIC_FIELDS:
+            return self.table.value(field, self.row)
+        raise AttributeError(field)
+
+    def __repr__(self):
+        return 'ElementView({}, {})'.format(self.name, self.number)
+
+
+class ElementTable:
+    def __init__(self, names, numbers):
+        self.names = list(names)
+        self.numbers = array('i', numbers)
+        self.values = {field: array('d', bytes(8 * len(self.names))) for field in NUMERIC_FIELDS}
+        self.mask = {field: array('B', bytes(len(self.names))) for field in NUMERIC_FIELDS}
+        self.rows = {}
+        for row, (name, number) in enumerate(zip(self.names, self.numbers)):
+            self.rows[name] = row
+            self.rows[str(number)] = row
+        self._order = {}
+
+    @classmethod
+    def from_elements(cls, elements):
+        table = cls([e.name for e in elements], [int(e.number) for e in elements])
+        for row, element in enumerate(elements):
+            for field in NUMERIC_FIELDS:
+                table.set(field, row, to_float(getattr(element, field)))
+        return table
+
+    def __len__(self):
+        return len(self.names)
+
+    def set(self, field, row, value):
+        if value is None:
+            self.values[field][row] = 0.0
+            self.mask[field][row] = 0
+        else:
+            self.values[field][row] = value
+            self.mask[field][row] = 1
+        self._order.pop(field, None)
+
+    def value(self, field, row):
+        return self.values[field][row] if self.mask[field][row] else None
+
+    def view(self, key):
+        # key可以是行号, 元素符号或原子序数字符串
+        if isinstance(key, int):
+            return ElementView(self, key)
+        return ElementView(self, self.rows[key])
+
+    def order(self, field):
+        # 按field升序排好的行号, 缺失值不参与排序; 结果缓存到该列被修改为止
+        order = self._order.get(field)
+        if order is None:
+            values = self.values[field]
+            order = array('i', sorted((row for row, m in enumerate(self.mask[field]) if m),
+                                      key=values.__getitem__))
+            self._order[field] = order
+        return order
+
+    def where(self, field, low=None, high=None):
+        values = self.values[field]
+        rows = [row for row, m in enumerate(self.mask[field]) if m]
+        if low is not None:
+            rows = [row for row in rows if values[row] >= low]
+        if high is not None:
+            rows = [row for row in rows if values[row] <= high]
+        return rows
+
+    def select(self, field=None, low=None, high=None, order_by=None, reverse=False):
+        # 例: select('boiling_point', 300, 1000, order_by='crust', reverse=True)
+        rows = self.where(field, low, high) if field is not None else range(len(self))
+        if order_by is not None:
+            wanted = set(rows)
+            order = self.order(order_by)
+            ordered = [row for row in (reversed(order) if reverse else order) if row in wanted]
+            missing = [row for row in rows if not self.mask[order_by][row]]
+            rows = ordered + missing
+        return [ElementView(self, row) for row in rows]
@@ -0,0 +1,102 @@
+import json
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+logger = logging.getLogger('ptable.timing')
+
+_record = contextvars.ContextVar('timing_record', default=None)
+_stage = contextvars.ContextVar('timing_stage', default=None)
+
+
+class Record:
+    # 一次查询的计时记录; 线程池中的子任务通过copy_context共享同一个Record
+    def __init__(self, query):
+        self.query = query
+        self.start = time.perf_counter()
+        self.total = None
+        self.stages = []
+        self.callbacks = []
+        self._lock = threading.Lock()
+
+    def finish(self):
+        # 延迟加载的字段可能在collect结束后才完成, 可以再次调用以更新总时间
+        self.total = time.perf_counter() - self.start
+
+    def add(self, stage):
+        with self._lock:
+            self.stages.append(stage)
+
+    def to_dict(self):
+        return {'query': self.query,
+                'total': self.total,
+                'stages': [dict(stage) for stage in self.stages]}
+
+    def summary(self):
+        parts = []
+        for stage in self.stages:
+            text = '{} {:.1f}ms'.format(stage['stage'], stage['seconds'] * 1000)
+            extra = [stage['cache']] if stage['cache'] else []
+            if stage['bytes']:
+                extra.append('{:.1f}KB'.format(stage['bytes'] / 1024))
+            if extra:
+                text += '(' + ', '.join(extra) + ')'
+            parts.append(text)
+        return '总计 {:.1f}ms | '.format((self.total or 0) * 1000) + ' | '.join(parts)
+
+
+@contextmanager
+def collect(query, callback=None):
+    # 只有传入callback或日志级别为DEBUG时才记录, 否则返回None, stage和note都不做任何事
+    # 嵌套调用时沿用外层的记录, 内层的callback在外层结束时和外层的一起调用
+    record = _record.get()
+    if record is not None:
+        if callback is not None:
+            record.callbacks.append(callback)
+        yield record
+        return
+    if callback is None and not logger.isEnabledFor(logging.DEBUG):
+        yield None
+        return
+    record = Record(query)
+    if callback is not None:
+        record.callbacks.append(callback)
+    token = _record.set(record)
+    try:
+        yield record
+    finally:
+        _record.reset(token)
+        record.finish()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(json.dumps(record.to_dict(), ensure_ascii=False))
+        for callback in record.callbacks:
+            callback(record)
+
+
+@contextmanager
+def stage(name):
+    record = _record.get()
+    if record is None:
+        yield None
+        return
+    item = {'stage': name, 'seconds': None, 'bytes': 0, 'cache': None}
+    token = _stage.set(item)
+    start = time.perf_counter()
+    try:
+        yield item
+    finally:
+        item['seconds'] = time.perf_counter() - start
+        _stage.reset(token)
+        record.add(item)
+
+
+def note(cache=None, bytes=0):
+    item = _stage.get()
+    if item is None:
+        return
+    if cache is not None:
+        item['cache'] = cache
+    item['bytes'] += bytes
+
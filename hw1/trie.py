@@ -0,0 +1,37 @@
+class Trie:
+    # 每个节点是 [子节点字典, 该前缀下的候选列表]; 候选在插入时就放好, 补全时不用再遍历子树
+    def __init__(self, limit=10):
+        self.limit = limit
+        self.root = ({}, [])
+        self.values = {}
+
+    def insert(self, key, value):
+        # 和ptable索引一样, 同一个完整的key以第一次插入的为准
+        self.values.setdefault(key, value)
+        node = self.root
+        for char in key.lower():
+            node = node[0].setdefault(char, ({}, []))
+            if len(node[1]) < self.limit and value not in node[1]:
+                node[1].append(value)
+
+    def complete(self, prefix):
+        node = self.root
+        for char in prefix.lower():
+            node = node[0].get(char)
+            if node is None:
+                return []
+        return node[1]
+
+    def get(self, key, default=None):
+        # 完整匹配, 不区分前缀; 用来把中文名, 英文名和序数换成元素符号
+        return self.values.get(key, default)
+
+
+def build_trie(records, limit=10):
+    # records中的每一项是ptable索引里的记录, 补全结果为元素符号
+    trie = Trie(limit)
+    for record in records:
+        for key in (record['symbol'], record['name'], record.get('english'), record['number']):
+            if key:
+                trie.insert(key, record['symbol'])
+    return trie
@@ -0,0 +1,39 @@
+import os
+import json
+import threading
+import cache
+
+# 每个元素被查询的次数, 保存在缓存目录里, 用来决定启动时预取哪些元素
+FILE_NAME = 'usage.json'
+
+_counts = None
+_lock = threading.Lock()
+
+
+def _path():
+    return os.path.join(cache.CACHE_DIR, FILE_NAME)
+
+
+def _load():
+    global _counts
+    if _counts is None:
+        try:
+            with open(_path(), 'r', encoding='utf-8') as file:
+                _counts = {k: int(v) for k, v in json.load(file).items()}
+        except (OSError, ValueError, AttributeError):
+            _counts = {}
+    return _counts
+
+
+def record(symbol):
+    with _lock:
+        counts = _load()
+        counts[symbol] = counts.get(symbol, 0) + 1
+        os.makedirs(cache.CACHE_DIR, exist_ok=True)
+        cache._write(_path(), lambda file: json.dump(counts, file))
+
+
+def top(n=10):
+    with _lock:
+        counts = _load()
+        return sorted(counts, key=lambda k: (-counts[k], k))[:n]
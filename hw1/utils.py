@@ -1,5 +1,3 @@
-import requests
-from bs4 import BeautifulSoup
+# 这里只放非界面模块都会用到的轻量依赖; requests, bs4和PyQt6在用到的地方再导入
 import json
 import sys
-from PyQt6.QtWidgets import QMainWindow, QApplication, QGridLayout, QPushButton, QLineEdit, QLabel, QTextEdit,QWidget
\ No newline at end of file
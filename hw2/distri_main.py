@@ -23,6 +23,9 @@ from torch.optim.lr_scheduler import StepLR
 from torch.utils.data import Subset
 from torch.utils.tensorboard import SummaryWriter
 
+from tiny_imagenet import CachedImageFolder, TinyImageNetVal, MemmapDataset, BatchAugment, to_uint8_tensor, \
+    add_input_normalization, image_folders
+
 model_names = sorted(name for name in models.__dict__
                      if name.islower() and not name.startswith("__")
                      and callable(models.__dict__[name]))
@@ -80,6 +83,20 @@ parser.add_argument('--multiprocessing-distributed', action='store_true',
                          'multi node data parallel training')  # 使用多进程分布式训练来在每个节点上启动N个进程
 parser.add_argument('--dummy', action='store_true',
                     help="use fake data to benchmark")  # 使用虚拟数据进行基准测试 基准测试是评估算法、模型或系统性能的一种方法
+parser.add_argument('--memmap', default='', type=str, metavar='DIR',
+                    help='read pre-decoded uint8 arrays from DIR '
+                         '(created by "python tiny_imagenet.py convert")')  # 不再每轮解码JPEG
+parser.add_argument('--batch-aug', action='store_true',
+                    help='augment and normalize whole uint8 batches on the training device '
+                         'instead of per sample in the loader workers')  # worker 只负责读图
+parser.add_argument('--crop-padding', default=0, type=int, metavar='N',
+                    help='random crop after N pixels of zero padding, '
+                         'only with --batch-aug (default: 0, no cropping)')
+parser.add_argument('--uint8', action='store_true',
+                    help='loader workers emit uint8 CHW tensors; conversion to float and '
+                         'normalization run as the first stage of the model')  # 进程间传输和拷贝的数据量是float32的1/4
+parser.add_argument('--rebuild-index', action='store_true',
+                    help='rescan the dataset directories instead of using the cached file index')
 
 best_acc1 = 0
 writer = 0
@@ -107,6 +124,9 @@ def main():
 
     args.distributed = args.world_size > 1 or args.multiprocessing_distributed  # 进程数量大于1或根据设置 进行分布式训练
 
+    if not args.dummy and not args.memmap:  # 启动训练进程之前检查并建好文件索引, 每个进程直接读取
+        image_folders(args.data, rebuild=args.rebuild_index)
+
     if torch.cuda.is_available():
         ngpus_per_node = torch.cuda.device_count()  # 检查当前系统是否支持CUDA，
     else:
@@ -150,6 +170,8 @@ def main_worker(gpu, ngpus_per_node, args):  # 主要训练函数
     else:
         print("=> creating model '{}'".format(args.arch))
         model = models.__dict__[args.arch]()
+    if args.uint8:  # 模型的第一个阶段把 uint8 输入转成浮点并归一化
+        add_input_normalization(model)
 
     if not torch.cuda.is_available() and not torch.backends.mps.is_available():  # 后者检查系统是否支持CUDA的多进程模式（MPS）
         print('using CPU, this will be slow')
@@ -233,13 +255,30 @@ def main_worker(gpu, ngpus_per_node, args):  # 主要训练函数
         print("=> Dummy data is used!")
         train_dataset = datasets.FakeData(1281167, (3, 224, 224), 200, transforms.ToTensor())
         val_dataset = datasets.FakeData(50000, (3, 224, 224), 200, transforms.ToTensor())
+    elif args.memmap:  # 预解码的 uint8 数组, 样本是 HWC 的 numpy 数组
+        print("=> using pre-decoded images from '{}'".format(args.memmap))
+        normalize = transforms.Normalize(mean=[0.485, 0.456, 0.406],
+                                         std=[0.229, 0.224, 0.225])
+        train_dataset = MemmapDataset(
+            args.memmap, 'train',
+            transforms.Compose([
+                transforms.ToTensor(),
+                transforms.RandomHorizontalFlip(),
+                normalize,
+            ]))
+        val_dataset = MemmapDataset(
+            args.memmap, 'val',
+            transforms.Compose([
+                transforms.ToTensor(),
+                normalize,
+            ]))
     else:  # 导入数据
         traindir = os.path.join(args.data, 'train')  # 训练集
         valdir = os.path.join(args.data, 'val')  # 验证集
         normalize = transforms.Normalize(mean=[0.485, 0.456, 0.406],
                                          std=[0.229, 0.224, 0.225])  # 正则化
 
-        train_dataset = datasets.ImageFolder(  #
+        train_dataset = CachedImageFolder(  # 文件列表缓存在 train.index.json, 不再每次遍历目录
             traindir,
             transforms.Compose([
                 transforms.RandomHorizontalFlip(),  # 水平反转
@@ -247,36 +286,24 @@ def main_worker(gpu, ngpus_per_node, args):  # 主要训练函数
                 normalize,
             ]))
 
-        val_dataset = datasets.ImageFolder(
+        val_dataset = TinyImageNetVal(  # 标签按 val_annotations.txt 对应到训练集的类别
             valdir,
+            train_dataset.classes,
             transforms.Compose([
                 transforms.ToTensor(),
                 normalize,
             ]))
-        val_dataset.classes = train_dataset.classes
-        tag_list = []
-        val_annodir = os.path.join(args.data, 'val')
-        val_annodir = os.path.join(val_annodir, 'val_annotations.txt')
-        with open(val_annodir, 'r') as file:
-            content = file.read()
-            words = content.split()
-            times = 0
-            for word in words:
-                if times % 6 == 1:
-                    tag_list.append(word)
-                times += 1
-        i = 0
-        for img_name in val_dataset.imgs:
-            pic_name = val_dataset.imgs[i][0]
-            pic_num = os.path.basename(pic_name)
-            pic_num = pic_num[4:]
-            pic_num = ''.join(c for c in pic_num if c.isdigit())
-            pic_num = int(pic_num)
-            tag_num = train_dataset.classes.index(tag_list[pic_num])
-            tag_tuple = (pic_name, tag_num)
-            val_dataset.imgs[i] = tag_tuple
-            val_dataset.targets[i] = tag_num
-            i = i + 1
+    augment = None
+    if args.batch_aug:  # worker 只把图片转成 uint8 张量, 增强和归一化在整个 batch 上做
+        train_dataset.transform = val_dataset.transform = to_uint8_tensor
+        augment = BatchAugment(padding=args.crop_padding, normalize=not args.uint8)
+    elif args.uint8:  # worker 翻转后直接输出 uint8 张量, 不转浮点也不归一化
+        train_dataset.transform = transforms.Compose([
+            to_uint8_tensor,
+            transforms.RandomHorizontalFlip(),
+        ])
+        val_dataset.transform = to_uint8_tensor
+
     if args.distributed:
         train_sampler = torch.utils.data.distributed.DistributedSampler(train_dataset)  # 分布式采样器
         val_sampler = torch.utils.data.distributed.DistributedSampler(val_dataset, shuffle=False,
@@ -294,7 +321,7 @@ def main_worker(gpu, ngpus_per_node, args):  # 主要训练函数
         num_workers=args.workers, pin_memory=True, sampler=val_sampler)
 
     if args.evaluate:  # 评估模式
-        validate(val_loader, model, criterion, args)
+        validate(val_loader, model, criterion, args, augment=augment)
         return
 
     start = time.time()
@@ -303,10 +330,10 @@ def main_worker(gpu, ngpus_per_node, args):  # 主要训练函数
             train_sampler.set_epoch(epoch)  # 设置新的数据划分
 
         # train for one epoch
-        train(train_loader, model, criterion, optimizer, epoch, device, args)  # 每轮的训练函数
+        train(train_loader, model, criterion, optimizer, epoch, device, args, augment)  # 每轮的训练函数
 
         # evaluate on validation set
-        acc1 = validate(val_loader, model, criterion, args, epoch)  # 每轮的评估值
+        acc1 = validate(val_loader, model, criterion, args, epoch, augment)  # 每轮的评估值
         print("total train time : {} s".format(time.time()-start))
         writer.add_scalar('training time', time.time()-start, epoch)
 
@@ -328,7 +355,7 @@ def main_worker(gpu, ngpus_per_node, args):  # 主要训练函数
             }, is_best)
 
 
-def train(train_loader, model, criterion, optimizer, epoch, device, args):
+def train(train_loader, model, criterion, optimizer, epoch, device, args, augment=None):
     batch_time = AverageMeter('Time', ':6.3f')  # 统计各项指标
     data_time = AverageMeter('Data', ':6.3f')
     losses = AverageMeter('Loss', ':.4e')
@@ -354,6 +381,9 @@ def train(train_loader, model, criterion, optimizer, epoch, device, args):
         images = images.to(device, non_blocking=True)  # 移动到对应设备
         target = target.to(device, non_blocking=True)
 
+        if augment is not None:  # 整个 batch 一起翻转/裁剪/归一化
+            images = augment(images)
+
         # compute output
         output = model(images)
         loss = criterion(output, target)
@@ -390,7 +420,7 @@ def train(train_loader, model, criterion, optimizer, epoch, device, args):
             progress.display(i + 1)  # 打印
 
 
-def validate(val_loader, model, criterion, args, epoch=0):
+def validate(val_loader, model, criterion, args, epoch=0, augment=None):
     def run_validate(loader, base_progress=0):
         with torch.no_grad():
             end = time.time()
@@ -406,6 +436,9 @@ def validate(val_loader, model, criterion, args, epoch=0):
                 if torch.cuda.is_available():
                     target = target.cuda(args.gpu, non_blocking=True)
 
+                if augment is not None:
+                    images = augment(images, train=False)
+
                 # compute output
                 output = model(images)
                 loss = criterion(output, target)
@@ -0,0 +1,404 @@
+import os
+import json
+import time
+import argparse
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+import torch.utils.data
+import torchvision.datasets as datasets
+import torchvision.transforms as transforms
+from torch.utils.data import Dataset
+from torchvision.datasets.folder import default_loader, has_file_allowed_extension, IMG_EXTENSIONS
+
+# Tiny-ImageNet 的数据集工具, 四个训练脚本共用
+# 预解码: python tiny_imagenet.py convert tiny-imagenet-200
+# 对比速度: python tiny_imagenet.py bench tiny-imagenet-200
+ANNOTATIONS = 'val_annotations.txt'
+IMAGE_SIZE = 64
+MEMMAP_DIR = 'uint8'
+MEAN = [0.485, 0.456, 0.406]
+STD = [0.229, 0.224, 0.225]
+
+
+def index_path(root):
+    # 索引文件放在数据目录旁边, 例如 tiny-imagenet-200/val -> tiny-imagenet-200/val.index.json
+    return os.path.normpath(root) + '.index.json'
+
+
+def _stat_key(path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _save_json(path, obj):
+    # 先写临时文件再替换, 多个进程同时写也不会读到半个文件; 数据目录只读时放弃缓存
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(tmp_path, 'w') as file:
+            json.dump(obj, file, separators=(',', ':'))
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _load_json(path):
+    try:
+        with open(path, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _dir_mtimes(root, dirs):
+    return [os.stat(os.path.join(root, directory)).st_mtime_ns for directory in dirs]
+
+
+class CachedImageFolder(datasets.ImageFolder):
+    # 和 ImageFolder 相同, 但类别和 (路径, 标签) 列表缓存在 <root>.index.json
+    # 启动时只 stat 建索引时见过的目录(Tiny-ImageNet 训练集约 400 个), 不再遍历和检查十几万个文件;
+    # 增删文件或子目录都会改变所在目录的 mtime, 任何一个目录变了就重新遍历
+    def __init__(self, root, transform=None, target_transform=None, loader=default_loader, rebuild=False):
+        self._index = None if rebuild else self._load_index(root)
+        super().__init__(root, transform, target_transform, loader)
+        self._index = None  # 样本列表已经展开, 不随 Dataset 传给 worker
+
+    @staticmethod
+    def _load_index(root):
+        index = _load_json(index_path(root))
+        if index is None:
+            return None
+        try:
+            if _dir_mtimes(root, index['dirs']) != index['mtimes']:
+                return None
+        except OSError:
+            return None
+        return index
+
+    def _build_index(self, root):
+        # 遍历顺序和 ImageFolder 一样: 类别按名字排序, 每个类别内按 os.walk 排序, 文件名排序
+        print("=> indexing '{}'".format(root))
+        classes, _ = super().find_classes(root)
+        dirs = ['']
+        files = []  # [目录, 标签, [文件名...]], 同一目录下的文件共用路径前缀
+        for target, cls in enumerate(classes):
+            for directory, _, names in sorted(os.walk(os.path.join(root, cls), followlinks=True)):
+                directory = os.path.relpath(directory, root)
+                dirs.append(directory)
+                names = [name for name in sorted(names) if has_file_allowed_extension(name, IMG_EXTENSIONS)]
+                if names:
+                    files.append([directory, target, names])
+        index = {'dirs': dirs, 'mtimes': _dir_mtimes(root, dirs), 'classes': classes, 'files': files}
+        _save_json(index_path(root), index)
+        return index
+
+    def find_classes(self, directory):
+        if self._index is None:
+            self._index = self._build_index(directory)
+        classes = self._index['classes']
+        return classes, {cls: i for i, cls in enumerate(classes)}
+
+    def make_dataset(self, directory, class_to_idx, *args, **kwargs):
+        samples = []
+        for subdir, target, names in self._index['files']:
+            subdir = os.path.join(directory, subdir)
+            samples.extend((os.path.join(subdir, name), target) for name in names)
+        return samples
+
+
+def read_val_annotations(path):
+    # 逐行读取, 返回 {文件名: wnid}; 每行格式为 文件名 wnid x0 y0 x1 y1
+    labels = {}
+    with open(path, 'r') as file:
+        for line in file:
+            parts = line.split()
+            if len(parts) >= 2:
+                labels[parts[0]] = parts[1]
+    return labels
+
+
+class TinyImageNetVal(Dataset):
+    # 验证集: 图片都在 val/images 下, 标签来自 val_annotations.txt
+    # 和 ImageFolder 一样提供 samples/imgs/targets/classes, 样本按文件名排序, 可以直接配合 DistributedSampler
+    def __init__(self, root, classes, transform=None, target_transform=None, loader=default_loader,
+                 rebuild=False):
+        self.root = root
+        self.classes = list(classes)
+        self.class_to_idx = {cls: i for i, cls in enumerate(self.classes)}
+        self.transform = transform
+        self.target_transform = target_transform
+        self.loader = loader
+        self.samples = self._load_samples(rebuild)
+        self.imgs = self.samples
+        self.targets = [target for _, target in self.samples]
+
+    def _load_samples(self, rebuild):
+        # 标注文件, 图片目录和类别都没变时直接用缓存的 (文件名, 标签), 否则重新解析一遍
+        annotations = os.path.join(self.root, ANNOTATIONS)
+        images = os.path.join(self.root, 'images')
+        key = {'annotations': _stat_key(annotations), 'images': _dir_mtimes(images, ['']),
+               'classes': self.classes}
+        path = index_path(self.root)
+        cached = None if rebuild else _load_json(path)
+        if cached is not None and cached.get('key') == key:
+            samples = cached['samples']
+        else:
+            labels = read_val_annotations(annotations)
+            samples = [[name, self.class_to_idx[labels[name]]] for name in sorted(labels)]
+            _save_json(path, {'key': key, 'samples': samples})
+        return [(os.path.join(images, name), target) for name, target in samples]
+
+    def __getitem__(self, index):
+        path, target = self.samples[index]
+        sample = self.loader(path)
+        if self.transform is not None:
+            sample = self.transform(sample)
+        if self.target_transform is not None:
+            target = self.target_transform(target)
+        return sample, target
+
+    def __len__(self):
+        return len(self.samples)
+
+
+def memmap_paths(root, split):
+    # (图片数组, 标签数组, 类别和原文件名)
+    return (os.path.join(root, split + '_images.npy'), os.path.join(root, split + '_labels.npy'),
+            os.path.join(root, split + '.json'))
+
+
+def _to_array(image):
+    # 在 DataLoader 的 worker 里解码成 HWC uint8; default_loader 已经把灰度图转成了 RGB
+    if image.size != (IMAGE_SIZE, IMAGE_SIZE):
+        image = image.resize((IMAGE_SIZE, IMAGE_SIZE))
+    return np.array(image, dtype=np.uint8)
+
+
+def convert(dataset, root, split, workers=4, batch_size=256):
+    # 把 ImageFolder/TinyImageNetVal 整个解码进一个 N x 64 x 64 x 3 的 uint8 数组, 只需要做一次
+    # 先写临时文件, 全部写完再改名, 中途中断不会留下不完整的缓存
+    os.makedirs(root, exist_ok=True)
+    paths = memmap_paths(root, split)
+    tmp_paths = [path + '.tmp' for path in paths]
+    dataset.transform = _to_array
+    images = np.lib.format.open_memmap(tmp_paths[0], mode='w+', dtype=np.uint8,
+                                       shape=(len(dataset), IMAGE_SIZE, IMAGE_SIZE, 3))
+    loader = torch.utils.data.DataLoader(dataset, batch_size=batch_size, shuffle=False, num_workers=workers)
+    start = 0
+    for batch, _ in loader:
+        images[start:start + len(batch)] = batch.numpy()
+        start += len(batch)
+    images.flush()
+    del images
+    with open(tmp_paths[1], 'wb') as file:  # 传文件对象, 否则 np.save 会给文件名补 .npy 后缀
+        np.save(file, np.asarray(dataset.targets, dtype=np.int64))
+    with open(tmp_paths[2], 'w') as file:
+        json.dump({'classes': dataset.classes, 'files': [path for path, _ in dataset.samples]}, file)
+    for tmp_path, path in zip(tmp_paths, paths):
+        os.replace(tmp_path, path)
+
+
+class MemmapDataset(Dataset):
+    # 从预解码的 uint8 数组读样本, 不再解码 JPEG; 样本是 HWC 的 numpy 数组, transforms.ToTensor 可以直接处理
+    # 每个进程第一次取样本时才打开映射, 所有 worker 通过系统页缓存共享同一份数据
+    def __init__(self, root, split, transform=None, target_transform=None):
+        self.images_path, labels_path, meta_path = memmap_paths(root, split)
+        with open(meta_path, 'r') as file:
+            meta = json.load(file)
+        self.classes = meta['classes']
+        self.class_to_idx = {cls: i for i, cls in enumerate(self.classes)}
+        self.targets = np.load(labels_path).tolist()
+        self.samples = list(zip(meta['files'], self.targets))
+        self.imgs = self.samples
+        self.transform = transform
+        self.target_transform = target_transform
+        self.images = None
+
+    def __getstate__(self):
+        # 映射不随 Dataset 传给 worker, 由 worker 自己打开
+        state = self.__dict__.copy()
+        state['images'] = None
+        return state
+
+    def __getitem__(self, index):
+        if self.images is None:
+            self.images = np.load(self.images_path, mmap_mode='r')
+        sample = np.array(self.images[index])  # 复制一份 12KB, 映射本身是只读的
+        target = self.targets[index]
+        if self.transform is not None:
+            sample = self.transform(sample)
+        if self.target_transform is not None:
+            target = self.target_transform(target)
+        return sample, target
+
+    def __len__(self):
+        return len(self.targets)
+
+
+def to_uint8_tensor(sample):
+    # 只在 worker 里做的转换: PIL 图片或 HWC numpy 数组 -> CHW uint8 张量, 不做增强也不转浮点
+    if isinstance(sample, np.ndarray):
+        return torch.from_numpy(sample).permute(2, 0, 1)
+    return transforms.functional.pil_to_tensor(sample)
+
+
+def _scale_bias(mean, std):
+    # (x / 255 - mean) / std 合成一次乘法和一次加法
+    mean = torch.tensor(mean).view(1, -1, 1, 1)
+    std = torch.tensor(std).view(1, -1, 1, 1)
+    return 1.0 / (255.0 * std), -mean / std
+
+
+class InputNormalize(nn.Module):
+    # 模型的第一个阶段: uint8 输入转成浮点并归一化; 已经是浮点的输入原样返回
+    def __init__(self, mean=MEAN, std=STD):
+        super().__init__()
+        scale, bias = _scale_bias(mean, std)
+        # 不保存到 state_dict, checkpoint 和原来的模型完全一样
+        self.register_buffer('scale', scale, persistent=False)
+        self.register_buffer('bias', bias, persistent=False)
+
+    def forward(self, images):
+        if images.dtype != torch.uint8:
+            return images
+        return images.float().mul_(self.scale).add_(self.bias)
+
+
+def _normalize_input(model, inputs):
+    # 输入先移到常量所在的设备: alexnet/vgg 只有 model.features 包了 DataParallel, 整个模型在 GPU 上,
+    # 而未指定 --gpu 时 validate() 和 add_graph 传进来的是 CPU 张量, 原来由 features 负责分发
+    normalize = model.input_normalize
+    images = inputs[0].to(normalize.scale.device, non_blocking=True)
+    return (normalize(images),) + inputs[1:]
+
+
+def add_input_normalization(model, mean=MEAN, std=STD):
+    # 用 forward pre-hook 接在 torchvision 模型前面, 而不是包一层 nn.Sequential:
+    # 参数名不变, 旧的 checkpoint 可以直接加载, alexnet/vgg 的 model.features 也还在
+    # 作为子模块随模型移动到设备, DataParallel 复制模型时每个副本用自己设备上的常量
+    model.input_normalize = InputNormalize(mean, std)
+    model.register_forward_pre_hook(_normalize_input)
+    return model
+
+
+class BatchAugment:
+    # 对整个 N x C x H x W 的 uint8 batch 做随机裁剪、随机水平翻转和归一化, 在主进程或训练设备上运行
+    # 裁剪和 transforms.RandomCrop(size, padding) 一样先补零再随机取原尺寸; padding 为 0 时不裁剪
+    # normalize=False 时输出仍是 uint8, 由模型前面的 InputNormalize 归一化
+    def __init__(self, mean=MEAN, std=STD, padding=0, flip=True, normalize=True):
+        self.scale, self.bias = _scale_bias(mean, std)
+        self.padding = padding
+        self.flip = flip
+        self.normalize_output = normalize
+        self._constants = {}
+
+    def _scale_bias(self, device):
+        # 常量按设备缓存
+        constants = self._constants.get(device)
+        if constants is None:
+            constants = self._constants[device] = (self.scale.to(device), self.bias.to(device))
+        return constants
+
+    def crop(self, images):
+        n, c, h, w = images.shape
+        p = self.padding
+        padded = F.pad(images, (p, p, p, p))
+        # 每张图一个偏移, 用高级索引一次取出所有裁剪结果
+        top = torch.randint(0, 2 * p + 1, (n, 1), device=images.device)
+        left = torch.randint(0, 2 * p + 1, (n, 1), device=images.device)
+        rows = (top + torch.arange(h, device=images.device)).view(n, 1, h, 1)
+        cols = (left + torch.arange(w, device=images.device)).view(n, 1, 1, w)
+        batch = torch.arange(n, device=images.device).view(n, 1, 1, 1)
+        channels = torch.arange(c, device=images.device).view(1, c, 1, 1)
+        return padded[batch, channels, rows, cols]
+
+    def random_flip(self, images):
+        flipped = torch.rand(images.size(0), device=images.device) < 0.5
+        return torch.where(flipped.view(-1, 1, 1, 1), images.flip(3), images)
+
+    def normalize(self, images):
+        scale, bias = self._scale_bias(images.device)
+        return images.float().mul_(scale).add_(bias)
+
+    def __call__(self, images, train=True):
+        if train:
+            if self.padding:
+                images = self.crop(images)
+            if self.flip:
+                images = self.random_flip(images)
+        return self.normalize(images) if self.normalize_output else images
+
+
+def image_folders(data, rebuild=False):
+    # 和训练脚本里一样的训练集和验证集, 不带 transform; 索引过期或 rebuild 时重新建立
+    train_dataset = CachedImageFolder(os.path.join(data, 'train'), rebuild=rebuild)
+    val_dataset = TinyImageNetVal(os.path.join(data, 'val'), train_dataset.classes, rebuild=rebuild)
+    return train_dataset, val_dataset
+
+
+def images_per_second(dataset, batch_size, workers, batches, augment=None):
+    # 第一个 batch 包含启动 worker 的时间, 不计入
+    loader = torch.utils.data.DataLoader(dataset, batch_size=batch_size, shuffle=True, num_workers=workers)
+    loader_iter = iter(loader)
+    next(loader_iter)
+    count = 0
+    start = time.time()
+    for i, (images, _) in enumerate(loader_iter):
+        if augment is not None:
+            images = augment(images)
+        count += images.size(0)
+        if i + 1 >= batches:
+            break
+    return count / (time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tiny-ImageNet uint8 memmap cache')
+    parser.add_argument('command', choices=['convert', 'bench'])
+    parser.add_argument('data', metavar='DIR', nargs='?', default='tiny-imagenet-200')
+    parser.add_argument('--out', metavar='DIR', help='memmap directory (default: DIR/{})'.format(MEMMAP_DIR))
+    parser.add_argument('-j', '--workers', default=4, type=int)
+    parser.add_argument('-b', '--batch-size', default=256, type=int)
+    parser.add_argument('--batches', default=100, type=int, help='batches per benchmark run')
+    args = parser.parse_args()
+    out = args.out or os.path.join(args.data, MEMMAP_DIR)
+
+    if args.command == 'convert':
+        for split, dataset in zip(('train', 'val'), image_folders(args.data)):
+            start = time.time()
+            convert(dataset, out, split, args.workers, args.batch_size)
+            print('{}: {} images -> {} ({:.1f} s)'.format(split, len(dataset), out, time.time() - start))
+        return
+
+    # 和训练时相同的增强和归一化, 只比较数据从哪里来
+    normalize = transforms.Normalize(mean=MEAN, std=STD)
+    train_dataset, _ = image_folders(args.data)
+    train_dataset.transform = transforms.Compose([
+        transforms.RandomHorizontalFlip(),
+        transforms.ToTensor(),
+        normalize,
+    ])
+    memmap_dataset = MemmapDataset(out, 'train', transforms.Compose([
+        transforms.ToTensor(),
+        transforms.RandomHorizontalFlip(),
+        normalize,
+    ]))
+    # --batch-aug: worker 只输出 uint8, 翻转和归一化在主进程里对整个 batch 做
+    batch_dataset = MemmapDataset(out, 'train', to_uint8_tensor)
+    # --uint8: worker 里翻转后输出 uint8, 归一化由 InputNormalize 做
+    uint8_dataset = MemmapDataset(out, 'train', transforms.Compose([
+        to_uint8_tensor,
+        transforms.RandomHorizontalFlip(),
+    ]))
+    for name, dataset, augment in (('ImageFolder', train_dataset, None), ('memmap', memmap_dataset, None),
+                                   ('memmap+uint8', uint8_dataset, InputNormalize()),
+                                   ('memmap+batch', batch_dataset, BatchAugment())):
+        print('{:12s} {:10.0f} images/s'.format(name, images_per_second(
+            dataset, args.batch_size, args.workers, args.batches, augment)))
+
+
+if __name__ == '__main__':
+    main()